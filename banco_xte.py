@@ -0,0 +1,188 @@
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from esquema_tiss import GUIA, campos
+from leitura_xte import colunas_finais
+from perfil import medir
+from tipagem_xte import restaurar_texto
+
+
+# --- Base local dos lotes lidos ---
+# Os lotes lidos podem ser acrescentados a um SQLite local e consultados depois sem ler
+# nenhum .xte de novo. Cada linha do DataFrame da leitura vira uma linha de `registros`,
+# com os mesmos textos; `lotes` tem uma linha por lote com os totais já calculados na
+# gravação, então os totais por competência/operadora somam só algumas linhas.
+# O mesmo lote (mesmas linhas, com qualquer nome) é gravado uma vez só.
+CAMINHO_BANCO = Path(os.environ.get("XTE_BANCO", Path.home() / ".local" / "share" / "am_consultoria" / "lotes.sqlite"))
+
+# Aumentar quando o esquema mudar; bases de outra versão são recusadas
+VERSAO_BANCO = 2
+
+# Linhas por executemany na gravação
+TAMANHO_BLOCO_BANCO = 50_000
+
+# Filtros da consulta, todos por igualdade e com índice
+COLUNAS_CONSULTA = {
+    'competenciaLote': 'Competência',
+    'registroANS_cabecalho': 'Registro ANS',
+    'numeroGuia_prestador': 'Guia no prestador',
+    'numeroGuia_operadora': 'Guia na operadora',
+    'cpfBeneficiario': 'CPF do beneficiário',
+    'numeroCartaoNacionalSaude': 'Cartão Nacional de Saúde',
+    'codigoCNPJ_CPF': 'CNPJ/CPF do prestador',
+    'CNES': 'CNES do prestador',
+}
+
+# Valores de guia somados nos totais (uma vez por guia, não por procedimento): os campos
+# do grupo valoresGuia do layout
+COLUNAS_TOTAIS = [campo['coluna'] for filho in GUIA['filhos'] if filho['tag'] == 'valoresGuia'
+                  for campo in campos(filho)]
+
+CHAVE_GUIA = ['numeroGuia_prestador', 'numeroGuia_operadora', 'identificacaoReembolso']
+
+
+def _nome(coluna):
+    return '"%s"' % coluna
+
+
+_ESQUEMA = [
+    "CREATE TABLE IF NOT EXISTS lotes (id INTEGER PRIMARY KEY, assinatura TEXT UNIQUE NOT NULL, "
+    "\"Nome da Origem\" TEXT, competenciaLote TEXT, registroANS TEXT, gravado_em TEXT, "
+    "linhas INTEGER, guias INTEGER, procedimentos INTEGER, "
+    + ", ".join(f"{coluna} REAL" for coluna in COLUNAS_TOTAIS) + ")",
+    "CREATE INDEX IF NOT EXISTS lotes_competencia ON lotes (competenciaLote, registroANS)",
+    "CREATE TABLE IF NOT EXISTS registros (lote_id INTEGER NOT NULL REFERENCES lotes (id), "
+    + ", ".join(f"{_nome(coluna)} {'INTEGER' if coluna == 'Idade_na_Realização' else 'TEXT'}"
+                for coluna in colunas_finais) + ")",
+] + [
+    f"CREATE INDEX IF NOT EXISTS registros_{coluna} ON registros ({_nome(coluna)})" for coluna in COLUNAS_CONSULTA
+]
+
+
+@contextmanager
+def _conectar(caminho):
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    with closing(sqlite3.connect(caminho)) as conexao:
+        # WAL: a página de consulta lê enquanto outra sessão grava
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("PRAGMA synchronous=NORMAL")
+        versao = conexao.execute("PRAGMA user_version").fetchone()[0]
+        if versao == 0:
+            with conexao:
+                for comando in _ESQUEMA:
+                    conexao.execute(comando)
+                conexao.execute(f"PRAGMA user_version={VERSAO_BANCO}")
+        elif versao != VERSAO_BANCO:
+            raise ValueError(f"A base {caminho} é da versão {versao}; esta versão do conversor usa a {VERSAO_BANCO}.")
+        yield conexao
+
+
+# Assinatura do lote pelos hashes das linhas dele (sem 'Nome da Origem'), na ordem em que aparecem
+def _assinatura(hashes):
+    return hashlib.sha256(hashes.tobytes()).hexdigest()
+
+
+# Linha de `lotes` de cada origem (pelo código dela): contagens e totais das guias, somados
+# na primeira linha de cada guia, que traz os valores dela
+def _resumos(texto, origens):
+    primeira_da_guia = ~texto[CHAVE_GUIA].assign(origem=origens).duplicated().to_numpy()
+    procedimento = texto[['codigoProcedimento', 'grupoProcedimento']].notna().any(axis=1).to_numpy()
+    resumos = texto[['competenciaLote', 'registroANS_cabecalho']].groupby(origens).first()
+    resumos.columns = ['competenciaLote', 'registroANS']
+    resumos['gravado_em'] = datetime.now().isoformat(timespec='seconds')
+    quantidade = len(resumos)
+    resumos['linhas'] = np.bincount(origens, minlength=quantidade)
+    resumos['guias'] = np.bincount(origens[primeira_da_guia], minlength=quantidade)
+    resumos['procedimentos'] = np.bincount(origens[procedimento], minlength=quantidade)
+    for coluna in COLUNAS_TOTAIS:
+        valores = pd.to_numeric(texto[coluna], errors='coerce').fillna(0).to_numpy()
+        resumos[coluna] = np.bincount(origens, weights=valores * primeira_da_guia, minlength=quantidade)
+    return resumos.to_dict(orient='records')
+
+
+# Acrescenta à base cada origem do DataFrame da leitura (textos ou modo compacto).
+# Devolve os nomes das origens gravadas e das que já estavam na base.
+def gravar_no_banco(df, caminho=CAMINHO_BANCO):
+    gravados, existentes = [], []
+    with medir('banco', len(df)), _conectar(caminho) as conexao:
+        colunas = ", ".join(_nome(coluna) for coluna in ['lote_id'] + colunas_finais)
+        inserir = f"INSERT INTO registros ({colunas}) VALUES ({', '.join('?' * (len(colunas_finais) + 1))})"
+        # Textos e hashes de todas as linhas de uma vez; cada origem é só uma fatia deles
+        texto = restaurar_texto(df).reindex(columns=colunas_finais).astype(object)
+        # Vazio vira NULL, como no modo compacto, para os dois darem a mesma assinatura
+        texto = texto.where(texto.notna() & (texto != ''), None)
+        hashes = pd.util.hash_pandas_object(texto.drop(columns='Nome da Origem'), index=False).to_numpy()
+        origens, nomes = pd.factorize(texto['Nome da Origem'], use_na_sentinel=False)
+        resumos = _resumos(texto, origens)
+        valores = texto.to_numpy()
+        ordem = np.argsort(origens, kind='stable')
+        for nome, resumo, linhas in zip(nomes, resumos, np.split(ordem, np.cumsum(np.bincount(origens))[:-1])):
+            assinatura = _assinatura(hashes[linhas])
+            if conexao.execute("SELECT 1 FROM lotes WHERE assinatura = ?", (assinatura,)).fetchone():
+                existentes.append(nome)
+                continue
+            resumo = {'assinatura': assinatura, 'Nome da Origem': nome, **resumo}
+            with conexao:
+                lote_id = conexao.execute(
+                    f"INSERT INTO lotes ({', '.join(map(_nome, resumo))}) VALUES ({', '.join('?' * len(resumo))})",
+                    list(resumo.values())).lastrowid
+                for inicio in range(0, len(linhas), TAMANHO_BLOCO_BANCO):
+                    bloco = valores[linhas[inicio:inicio + TAMANHO_BLOCO_BANCO]].tolist()
+                    conexao.executemany(inserir, ([lote_id] + linha for linha in bloco))
+            gravados.append(nome)
+    return gravados, existentes
+
+
+def _filtros_sql(filtros, colunas):
+    condicoes, parametros = [], []
+    for coluna, valor in filtros.items():
+        if coluna not in colunas:
+            raise ValueError(f"Filtro desconhecido: {coluna}")
+        if valor not in (None, ''):
+            condicoes.append(f"{colunas[coluna]} = ?")
+            parametros.append(str(valor).strip())
+    return (" WHERE " + " AND ".join(condicoes) if condicoes else ""), parametros
+
+
+def lotes_no_banco(caminho=CAMINHO_BANCO):
+    with _conectar(caminho) as conexao:
+        return pd.read_sql_query("SELECT * FROM lotes ORDER BY id", conexao)
+
+
+# Totais por competência e operadora, somando as linhas de `lotes`. Filtra só por
+# 'competenciaLote' e 'registroANS_cabecalho'.
+def totais_por_competencia(filtros=None, caminho=CAMINHO_BANCO):
+    onde, parametros = _filtros_sql(filtros or {}, {'competenciaLote': 'competenciaLote',
+                                                    'registroANS_cabecalho': 'registroANS'})
+    somas = ", ".join(f"SUM({coluna}) AS {coluna}" for coluna in COLUNAS_TOTAIS)
+    with _conectar(caminho) as conexao:
+        return pd.read_sql_query(
+            f"SELECT competenciaLote, registroANS, COUNT(*) AS lotes, SUM(linhas) AS linhas, SUM(guias) AS guias, "
+            f"SUM(procedimentos) AS procedimentos, {somas} FROM lotes{onde} "
+            f"GROUP BY competenciaLote, registroANS ORDER BY competenciaLote DESC, registroANS",
+            conexao, params=parametros)
+
+
+# Uma página das linhas que atendem aos filtros (colunas de COLUNAS_CONSULTA), na ordem
+# de gravação, e o total de linhas encontradas. `pagina` começa em 1.
+def consultar_registros(filtros=None, pagina=1, por_pagina=100, caminho=CAMINHO_BANCO):
+    onde, parametros = _filtros_sql(filtros or {}, {coluna: _nome(coluna) for coluna in COLUNAS_CONSULTA})
+    inicio = time.perf_counter()
+    with _conectar(caminho) as conexao:
+        # Sem filtro, o total vem de `lotes` em vez de percorrer `registros`
+        contagem = f"SELECT COUNT(*) FROM registros{onde}" if onde else "SELECT COALESCE(SUM(linhas), 0) FROM lotes"
+        total = conexao.execute(contagem, parametros).fetchone()[0]
+        colunas = ", ".join(map(_nome, colunas_finais))
+        df = pd.read_sql_query(
+            f"SELECT {colunas} FROM registros{onde} ORDER BY rowid LIMIT ? OFFSET ?",
+            conexao, params=parametros + [por_pagina, (max(pagina, 1) - 1) * por_pagina])
+    return df, total, time.perf_counter() - inicio
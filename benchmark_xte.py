@@ -0,0 +1,178 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# --- Benchmark das etapas de leitura, exportação, geração e ZIP ---
+# Para cada tamanho, monta os dados com lote_sintetico e mede cada etapa num processo novo
+# (spawn), para que o pico de memória (RSS) de uma etapa não contamine a outra.
+#   python benchmark_xte.py --guias 1000,10000,50000 --json resultado.json
+ETAPAS = ["leitura", "leitura_streaming", "excel", "csv", "parquet", "geracao", "geracao_em_blocos", "zip"]
+
+
+def _pico_rss_mb():
+    # No Linux o ru_maxrss herda o pico do processo pai através do exec; o VmHWM não
+    try:
+        with open("/proc/self/status") as status:
+            for linha in status:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return pico / 1024 ** 2 if sys.platform == "darwin" else pico / 1024
+
+
+def _medir(funcao):
+    inicio = time.perf_counter()
+    linhas, tamanho = funcao()
+    segundos = time.perf_counter() - inicio
+    return {
+        "linhas": linhas,
+        "mb": tamanho / 1024 ** 2,
+        "segundos": segundos,
+        "linhas_por_s": linhas / segundos if segundos else None,
+        "mb_por_s": tamanho / 1024 ** 2 / segundos if segundos else None,
+        "pico_rss_mb": _pico_rss_mb(),
+    }
+
+
+# Cada etapa roda sozinha num processo; as entradas são lidas do diretório de trabalho
+def executar_etapa(etapa, diretorio):
+    diretorio = Path(diretorio)
+
+    if etapa in ("leitura", "leitura_streaming"):
+        from leitura_xte import parse_xte_bytes
+        caminho = diretorio / "lote.xte"
+
+        def funcao():
+            df = parse_xte_bytes(caminho.name, caminho.read_bytes(), streaming=etapa == "leitura_streaming")
+            return len(df), caminho.stat().st_size
+
+    elif etapa in ("excel", "csv", "parquet"):
+        # As mesmas funções de exportação (em blocos) usadas pela página e pelo CLI
+        import pandas as pd
+        from exportacao import exportar_csv, exportar_excel, exportar_parquet
+        df = pd.read_parquet(diretorio / "lido.parquet")
+        exportar, extensao = {"excel": (exportar_excel, "xlsx"), "csv": (exportar_csv, "csv"),
+                              "parquet": (exportar_parquet, "parquet")}[etapa]
+        saida = diretorio / f"exportado.{extensao}"
+
+        def funcao():
+            exportar(df, saida)
+            return len(df), saida.stat().st_size
+
+    elif etapa in ("geracao", "geracao_em_blocos"):
+        from geracao_xte import iterar_xte_do_excel
+        caminho = diretorio / "planilha.csv"
+
+        def funcao():
+            tamanho = 0
+            with open(caminho, "rb") as excel_file:
+                for _, conteudo in iterar_xte_do_excel(excel_file, em_blocos=etapa == "geracao_em_blocos"):
+                    tamanho += len(conteudo)
+                excel_file.seek(0)
+                linhas = sum(1 for _ in excel_file) - 1
+            return linhas, tamanho
+
+    elif etapa == "zip":
+        # Aqui a contagem é de arquivos, não de linhas
+        arquivos = sorted((diretorio / "gerados").iterdir())
+
+        def funcao():
+            tamanho = 0
+            with zipfile.ZipFile(diretorio / "arquivos.zip", "w") as zipf:
+                for caminho in arquivos:
+                    conteudo = caminho.read_bytes()
+                    zipf.writestr(caminho.name, conteudo)
+                    tamanho += len(conteudo)
+            return len(arquivos), tamanho
+
+    else:
+        raise ValueError(f"Etapa desconhecida: {etapa}")
+
+    return _medir(funcao)
+
+
+def preparar_entradas(diretorio, guias, procedimentos, origens, semente):
+    from geracao_xte import iterar_xte_do_excel
+    from leitura_xte import parse_xte_bytes
+    from lote_sintetico import gerar_lote_sintetico, gerar_planilha_sintetica
+
+    diretorio = Path(diretorio)
+    lote = gerar_lote_sintetico(guias, procedimentos, semente=semente)
+    (diretorio / "lote.xte").write_bytes(lote)
+    parse_xte_bytes("lote.xte", lote).to_parquet(diretorio / "lido.parquet", index=False)
+
+    planilha = gerar_planilha_sintetica(guias, procedimentos, origens=origens, semente=semente)
+    planilha.to_csv(diretorio / "planilha.csv", index=False, sep=";")
+    (diretorio / "gerados").mkdir(exist_ok=True)
+    with open(diretorio / "planilha.csv", "rb") as excel_file:
+        for nome_limpo, conteudo in iterar_xte_do_excel(excel_file):
+            (diretorio / "gerados" / f"{nome_limpo}.xte").write_bytes(conteudo)
+
+
+def rodar_benchmark(tamanhos, etapas=ETAPAS, procedimentos=(1, 3), origens=4, semente=0, ao_medir=None):
+    resultados = []
+    contexto = multiprocessing.get_context("spawn")
+    for guias in tamanhos:
+        with tempfile.TemporaryDirectory() as diretorio:
+            preparar_entradas(diretorio, guias, procedimentos, origens, semente)
+            for etapa in etapas:
+                with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+                    medida = executor.submit(executar_etapa, etapa, diretorio).result()
+                medida = {"guias": guias, "etapa": etapa, **medida}
+                resultados.append(medida)
+                if ao_medir:
+                    ao_medir(medida)
+    return resultados
+
+
+def _formatar(medida):
+    def numero(valor, formato):
+        return "-" if valor is None else format(valor, formato)
+    return (f"{medida['guias']:>9} {medida['etapa']:<18} {medida['linhas']:>9} {numero(medida['mb'], '9.1f')} "
+            f"{numero(medida['segundos'], '9.2f')} {numero(medida['linhas_por_s'], '12,.0f')} "
+            f"{numero(medida['mb_por_s'], '8.1f')} {numero(medida['pico_rss_mb'], '9.0f')}")
+
+
+def _lista_inteiros(texto):
+    return [int(valor) for valor in texto.split(",") if valor]
+
+
+if __name__ == "__main__":
+    from lote_sintetico import _intervalo
+
+    parser = argparse.ArgumentParser(description="Mede leitura, exportação, geração e ZIP em lotes sintéticos.")
+    parser.add_argument("--guias", type=_lista_inteiros, default=[1000, 10000],
+                        help="Tamanhos (quantidade de guias), separados por vírgula. Padrão: 1000,10000.")
+    parser.add_argument("--procedimentos", type=_intervalo, default=(1, 3), help="Procedimentos por guia: N ou MIN-MAX.")
+    parser.add_argument("--origens", type=int, default=4, help="Arquivos gerados por planilha (Nome da Origem).")
+    parser.add_argument("--etapas", type=lambda texto: texto.split(","), default=ETAPAS,
+                        help=f"Etapas, separadas por vírgula. Padrão: {','.join(ETAPAS)}.")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--json", help="Grava os resultados neste arquivo JSON.")
+    args = parser.parse_args()
+
+    print(f"{'guias':>9} {'etapa':<18} {'linhas':>9} {'MB':>9} {'segundos':>9} {'linhas/s':>12} {'MB/s':>8} {'pico MB':>9}")
+    resultados = rodar_benchmark(args.guias, args.etapas, args.procedimentos, args.origens, args.semente,
+                                 ao_medir=lambda medida: print(_formatar(medida), flush=True))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump({"plataforma": sys.platform, "cpus": os.cpu_count(), "resultados": resultados},
+                      arquivo, indent=2, ensure_ascii=False)
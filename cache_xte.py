@@ -0,0 +1,107 @@
+import hashlib
+import os
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+
+# --- Cache em disco dos lotes já lidos ---
+# A chave é o hash do conteúdo bruto do .xte, então o mesmo lote enviado com outro nome
+# também é aproveitado. Só o DataFrame é guardado (Parquet), sem 'Nome da Origem', que é
+# recolocado na leitura. Quando passa do limite, os arquivos menos usados são removidos.
+DIRETORIO_CACHE = Path(os.environ.get("XTE_CACHE_DIR", Path.home() / ".cache" / "am_consultoria" / "xte"))
+TAMANHO_MAXIMO_CACHE = int(os.environ.get("XTE_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+# Aumentar quando a leitura mudar o DataFrame gerado, para não servir resultados antigos
+VERSAO_CACHE = 1
+
+# Arquivos .xte já gerados, pela assinatura das linhas da origem (geracao_xte.assinatura_origem)
+DIRETORIO_GERADOS = Path(os.environ.get("XTE_GERADOS_DIR", DIRETORIO_CACHE.parent / "gerados"))
+TAMANHO_MAXIMO_GERADOS = int(os.environ.get("XTE_GERADOS_MAX_MB", "1024")) * 1024 * 1024
+
+
+def hash_conteudo(dados):
+    return hashlib.sha256(dados).hexdigest()
+
+
+def _caminho(chave, diretorio):
+    return Path(diretorio) / f"v{VERSAO_CACHE}-{chave}.parquet"
+
+
+def ler_cache(chave, nome_origem, diretorio=DIRETORIO_CACHE):
+    caminho = _caminho(chave, diretorio)
+    try:
+        df = pd.read_parquet(caminho)
+        # Marca como usado recentemente para a remoção por tamanho
+        os.utime(caminho)
+    except FileNotFoundError:
+        return None
+    except (OSError, pa.ArrowException, ValueError):
+        # Entrada truncada ou corrompida: conta como ausente e sai do cache
+        caminho.unlink(missing_ok=True)
+        return None
+    df.insert(0, 'Nome da Origem', nome_origem)
+    return df
+
+
+# Grava num temporário e renomeia, para leituras concorrentes nunca verem arquivo pela metade
+def _gravar_atomico(caminho, escrever):
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.parent / f".{uuid.uuid4().hex}.tmp"
+    try:
+        escrever(temporario)
+        os.replace(temporario, caminho)
+    finally:
+        if temporario.exists():
+            temporario.unlink()
+
+
+def gravar_cache(chave, df, diretorio=DIRETORIO_CACHE, tamanho_maximo=TAMANHO_MAXIMO_CACHE):
+    df = df.drop(columns=['Nome da Origem'])
+    _gravar_atomico(_caminho(chave, diretorio),
+                    lambda temporario: df.to_parquet(temporario, index=False, compression="zstd"))
+    limpar_cache(diretorio, tamanho_maximo)
+
+
+# --- Arquivos gerados já conhecidos ---
+# Guarda o .xte pronto de cada origem. O conteúdo é servido como foi gravado, com o
+# numeroLote, a data e a hora da geração original (o hash do epílogo cobre esses campos).
+def _caminho_gerado(chave, diretorio):
+    return Path(diretorio) / f"{chave}.xte"
+
+
+def ler_gerado(chave, diretorio=DIRETORIO_GERADOS):
+    caminho = _caminho_gerado(chave, diretorio)
+    try:
+        conteudo = caminho.read_bytes()
+    except OSError:
+        return None
+    os.utime(caminho)
+    return conteudo
+
+
+def gravar_gerado(chave, conteudo, diretorio=DIRETORIO_GERADOS, tamanho_maximo=TAMANHO_MAXIMO_GERADOS):
+    _gravar_atomico(_caminho_gerado(chave, diretorio), lambda temporario: Path(temporario).write_bytes(conteudo))
+    limpar_cache(diretorio, tamanho_maximo, padrao="*.xte")
+
+
+def limpar_cache(diretorio=DIRETORIO_CACHE, tamanho_maximo=TAMANHO_MAXIMO_CACHE, padrao="*.parquet"):
+    arquivos = []
+    for caminho in Path(diretorio).glob(padrao):
+        try:
+            info = caminho.stat()
+        except FileNotFoundError:
+            continue
+        arquivos.append((info.st_mtime, info.st_size, caminho))
+
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= tamanho_maximo:
+            break
+        try:
+            caminho.unlink()
+        except FileNotFoundError:
+            pass
+        total -= tamanho
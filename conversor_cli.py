@@ -0,0 +1,287 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+
+# --- Conversor em lote pela linha de comando ---
+# Mesmas conversões da página do Streamlit, sem o Streamlit:
+#   python conversor_cli.py ler   <pastas/arquivos .xte/.zip> -s consolidado.xlsx
+#   python conversor_cli.py gerar <pastas/planilhas>     -s pasta_saida --zip
+#   python conversor_cli.py validar <pastas/planilhas>   -s relatorio.csv
+# pandas e os módulos de leitura/geração só são importados dentro de cada comando, então
+# o --help e os erros de argumento respondem na hora.
+FORMATOS_PLANILHA = ["xlsx", "csv", "parquet"]
+
+
+def listar_arquivos(entradas, extensoes, recursivo=False):
+    arquivos = []
+    for entrada in map(Path, entradas):
+        if entrada.is_dir():
+            candidatos = entrada.rglob("*") if recursivo else entrada.iterdir()
+            arquivos.extend(sorted(c for c in candidatos if c.is_file() and c.suffix.lower() in extensoes))
+        elif entrada.is_file():
+            arquivos.append(entrada)
+        else:
+            raise FileNotFoundError(f"Arquivo ou pasta não encontrado: {entrada}")
+    return arquivos
+
+
+# Grava o perfil por etapa (perfil.py) e mostra o resumo no stderr
+def _gravar_perfil(perfil, caminho):
+    from perfil import perfil_json, resumo_por_etapa, rotular_etapas
+
+    Path(caminho).write_text(perfil_json(perfil), encoding="utf-8")
+    print(rotular_etapas(resumo_por_etapa(perfil)).to_string(index=False, float_format="{:.3f}".format), file=sys.stderr)
+    print(f"Perfil por etapa gravado em {caminho}", file=sys.stderr)
+
+
+def _formato_saida(saida, formato):
+    if formato:
+        return formato
+    sufixo = Path(saida).suffix.lower().lstrip(".")
+    return sufixo if sufixo in FORMATOS_PLANILHA else "xlsx"
+
+
+# --- XTE -> planilha consolidada ---
+def comando_ler(args):
+    from exportacao import exportar_csv, exportar_excel, exportar_parquet
+    from leitura_xte import parse_xte_arquivo, parse_xte_zip
+    from paralelo import executar_em_paralelo
+    from perfil import com_perfil, perfilar
+    import pandas as pd
+
+    entradas = listar_arquivos(args.entradas, {".xte", ".zip"}, args.recursivo)
+    arquivos = [caminho for caminho in entradas if caminho.suffix.lower() != ".zip"]
+    zips = [caminho for caminho in entradas if caminho.suffix.lower() == ".zip"]
+    if not entradas:
+        print("Nenhum arquivo .xte ou .zip encontrado.", file=sys.stderr)
+        return 1
+
+    inicio = time.time()
+    total = len(arquivos)
+    andamento = {"arquivos": 0}
+
+    def concluido(i, lido):
+        df = lido[0] if args.perfil else lido
+        andamento["arquivos"] += 1
+        print(f"[{andamento['arquivos']}/{total}] {arquivos[i].name}: {len(df)} registros", file=sys.stderr)
+
+    tarefas = [(str(caminho), args.streaming, not args.sem_cache) for caminho in arquivos]
+    if args.perfil:
+        tarefas = [(parse_xte_arquivo, caminho.name) + tarefa for caminho, tarefa in zip(arquivos, tarefas)]
+    lidos = executar_em_paralelo(com_perfil if args.perfil else parse_xte_arquivo, tarefas,
+                                 max_workers=args.workers, ao_concluir=concluido)
+    perfil = [registro for _, registros in lidos for registro in registros] if args.perfil else None
+    dfs = [lido[0] for lido in lidos] if args.perfil else lidos
+
+    # Os .xte de cada ZIP são lidos direto do ZIP (sem extrair), vários ao mesmo tempo
+    for caminho_zip in zips:
+        def concluido_zip(indice, df):
+            nonlocal total
+            total += 1
+            print(f"{caminho_zip.name} [{indice + 1}]: {len(df)} registros", file=sys.stderr)
+
+        dfs.append(parse_xte_zip(str(caminho_zip), max_workers=args.workers, streaming=args.streaming,
+                                 usar_cache=not args.sem_cache, ao_concluir=concluido_zip, perfil=perfil))
+    final_df = pd.concat(dfs, ignore_index=True)
+
+    if args.duplicatas or args.remover_duplicatas:
+        from duplicatas_xte import detectar_duplicatas, remover_duplicatas
+
+        with perfilar("consolidado") as coletor:
+            duplicatas_df = detectar_duplicatas(final_df, args.nivel_duplicatas)
+            if args.remover_duplicatas:
+                total_antes = len(final_df)
+                final_df = remover_duplicatas(final_df, args.nivel_duplicatas, args.remover_duplicatas)
+        if perfil is not None:
+            perfil.extend(coletor.registros())
+        print(f"{duplicatas_df['Duplicata'].nunique()} chaves ({args.nivel_duplicatas}) em mais de um arquivo",
+              file=sys.stderr)
+        if args.remover_duplicatas:
+            print(f"{total_antes - len(final_df)} linhas repetidas removidas", file=sys.stderr)
+        if args.duplicatas:
+            exportar_duplicatas = exportar_csv if _formato_saida(args.duplicatas, None) == "csv" else exportar_excel
+            exportar_duplicatas(duplicatas_df, args.duplicatas)
+
+    if args.banco:
+        from banco_xte import CAMINHO_BANCO, gravar_no_banco
+
+        caminho_banco = CAMINHO_BANCO if args.banco is True else args.banco
+        with perfilar("consolidado") as coletor:
+            gravados, existentes = gravar_no_banco(final_df, caminho_banco)
+        if perfil is not None:
+            perfil.extend(coletor.registros())
+        print(f"{len(gravados)} lotes guardados em {caminho_banco} ({len(existentes)} já estavam lá)", file=sys.stderr)
+
+    # Acima do limite de linhas do Excel, o .xlsx continua em novas abas
+    exportar = {"xlsx": exportar_excel, "csv": exportar_csv, "parquet": exportar_parquet}
+    with perfilar(Path(args.saida).name) as coletor:
+        exportar[_formato_saida(args.saida, args.formato)](final_df, args.saida)
+
+    print(f"✅ {total} arquivos, {len(final_df)} registros -> {args.saida} ({time.time() - inicio:.1f}s)")
+    if args.perfil:
+        _gravar_perfil(perfil + coletor.registros(), args.perfil)
+    return 0
+
+
+# --- Planilha -> arquivos XTE/XML ---
+def comando_gerar(args):
+    from geracao_xte import gerar_xte_em_zip, iterar_xte_do_excel
+
+    planilhas = listar_arquivos(args.entradas, {".xlsx", ".csv"}, args.recursivo)
+    if not planilhas:
+        print("Nenhuma planilha .xlsx ou .csv encontrada.", file=sys.stderr)
+        return 1
+
+    destino = Path(args.saida)
+    destino.mkdir(parents=True, exist_ok=True)
+    extensao = f".{args.extensao}"
+    inicio = time.time()
+    gerados = 0
+    perfil = [] if args.perfil else None
+    reaproveitados = []
+    opcoes = {
+        "reaproveitar": args.reaproveitar, "forcar": args.forcar, "reaproveitados": reaproveitados,
+        "max_guias": args.max_guias, "max_bytes": int(args.max_mb * 1024 * 1024) if args.max_mb else None,
+    }
+
+    for planilha in planilhas:
+        # ler_planilha decide entre CSV e Excel pelo atributo .name, como no upload
+        with open(planilha, "rb") as excel_file:
+            if args.zip:
+                caminho_zip = destino / f"{planilha.stem}_{args.extensao}.zip"
+                nomes = gerar_xte_em_zip(excel_file, caminho_zip, extensao=extensao, max_workers=args.workers,
+                                         em_blocos=args.em_blocos, perfil=perfil, **opcoes)
+                print(f"{planilha.name}: {len(nomes)} arquivos -> {caminho_zip}", file=sys.stderr)
+                gerados += len(nomes)
+                continue
+
+            for nome_limpo, conteudo in iterar_xte_do_excel(excel_file, max_workers=args.workers,
+                                                            em_blocos=args.em_blocos, perfil=perfil,
+                                                            **opcoes):
+                (destino / f"{nome_limpo}{extensao}").write_bytes(conteudo)
+                gerados += 1
+            print(f"{planilha.name}: arquivos gravados em {destino}", file=sys.stderr)
+
+    if args.reaproveitar:
+        print(f"{len(reaproveitados)} arquivos reaproveitados de gerações anteriores", file=sys.stderr)
+    print(f"✅ {len(planilhas)} planilhas, {gerados} arquivos gerados ({time.time() - inicio:.1f}s)")
+    if args.perfil:
+        _gravar_perfil(perfil, args.perfil)
+    return 0
+
+
+# --- Validação das planilhas antes da geração ---
+def comando_validar(args):
+    from exportacao import exportar_csv, exportar_excel
+    from geracao_xte import ler_planilha
+    from perfil import medir, perfilar
+    from validacao_xte import resumo_validacao, validar_em_blocos, validar_planilha
+    import pandas as pd
+
+    planilhas = listar_arquivos(args.entradas, {".xlsx", ".csv"}, args.recursivo)
+    if not planilhas:
+        print("Nenhuma planilha .xlsx ou .csv encontrada.", file=sys.stderr)
+        return 1
+
+    inicio = time.time()
+    relatorios = []
+    perfil = []
+    for planilha in planilhas:
+        with open(planilha, "rb") as excel_file, perfilar(planilha.name) as coletor:
+            if args.em_blocos:
+                relatorio = validar_em_blocos(excel_file)
+            else:
+                with medir("leitura_planilha") as medida:
+                    df = ler_planilha(excel_file)
+                    medida["linhas"] = len(df)
+                relatorio = validar_planilha(df)
+        perfil.extend(coletor.registros())
+        print(f"{planilha.name}: {len(relatorio)} problemas", file=sys.stderr)
+        relatorios.append(relatorio.assign(Planilha=planilha.name))
+
+    # Relatórios vazios ficam de fora do concat (só o primeiro, para manter as colunas)
+    relatorio = pd.concat([relatorios[0]] + [r for r in relatorios[1:] if not r.empty], ignore_index=True)
+    relatorio = relatorio[["Planilha"] + [coluna for coluna in relatorio.columns if coluna != "Planilha"]]
+    if args.saida:
+        exportar = exportar_csv if _formato_saida(args.saida, None) == "csv" else exportar_excel
+        exportar(relatorio, args.saida)
+    if not relatorio.empty:
+        print(resumo_validacao(relatorio).to_string(index=False), file=sys.stderr)
+
+    print(f"{'✅' if relatorio.empty else '⚠️'} {len(planilhas)} planilhas, {len(relatorio)} problemas "
+          f"({time.time() - inicio:.1f}s)" + (f" -> {args.saida}" if args.saida else ""))
+    if args.perfil:
+        _gravar_perfil(perfil, args.perfil)
+    # Código de saída 2 quando há problemas, para uso em scripts
+    return 2 if not relatorio.empty else 0
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Conversor em lote XTE ⇄ Excel/CSV (sem interface web).")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    ler = subparsers.add_parser("ler", help="Converte arquivos .xte em uma planilha consolidada.")
+    ler.add_argument("entradas", nargs="+", help="Arquivos .xte, ZIPs com arquivos .xte ou pastas com eles.")
+    ler.add_argument("-s", "--saida", required=True, help="Arquivo de saída (.xlsx, .csv ou .parquet).")
+    ler.add_argument("-f", "--formato", choices=FORMATOS_PLANILHA,
+                     help="Formato da saída. Padrão: pela extensão do arquivo de saída (ou xlsx).")
+    ler.add_argument("--streaming", action="store_true", help="Lê cada arquivo aos poucos (lotes grandes).")
+    ler.add_argument("--sem-cache", action="store_true", help="Não usa o cache em disco dos lotes já lidos.")
+    ler.add_argument("--duplicatas", metavar="RELATORIO",
+                     help="Grava neste arquivo (.xlsx ou .csv) as guias/procedimentos presentes em mais de um arquivo.")
+    ler.add_argument("--nivel-duplicatas", choices=["procedimento", "guia"], default="procedimento",
+                     help="Compara procedimentos da guia ou guias inteiras. Padrão: procedimento.")
+    ler.add_argument("--remover-duplicatas", choices=["primeira", "ultima"],
+                     help="Antes de exportar, deixa cada guia/procedimento repetido só no primeiro ou no último arquivo.")
+    ler.add_argument("--banco", nargs="?", const=True, metavar="BASE.sqlite",
+                     help="Acrescenta os lotes lidos à base local (SQLite) usada na página de consulta. "
+                          "Sem caminho, usa a base padrão (XTE_BANCO).")
+    ler.set_defaults(funcao=comando_ler)
+
+    gerar = subparsers.add_parser("gerar", help="Gera os arquivos .xte/.xml a partir de planilhas.")
+    gerar.add_argument("entradas", nargs="+", help="Planilhas (.xlsx ou .csv) ou pastas com planilhas.")
+    gerar.add_argument("-s", "--saida", required=True, help="Pasta onde os arquivos (ou ZIPs) são gravados.")
+    gerar.add_argument("-e", "--extensao", choices=["xte", "xml"], default="xte",
+                       help="Extensão dos arquivos gerados (o conteúdo é o mesmo). Padrão: xte.")
+    gerar.add_argument("--zip", action="store_true", help="Grava um ZIP por planilha em vez de arquivos soltos.")
+    gerar.add_argument("--em-blocos", action="store_true",
+                       help="Lê a planilha aos poucos, gerando cada origem assim que suas linhas terminam "
+                            "(planilhas grandes; as linhas de cada origem precisam estar em sequência).")
+    gerar.add_argument("--reaproveitar", action="store_true",
+                       help="Reaproveita o arquivo já gerado das origens cujas linhas não mudaram desde a geração "
+                            "anterior (com o numeroLote, a data e a hora daquela geração).")
+    gerar.add_argument("--forcar", action="store_true",
+                       help="Com --reaproveitar, gera todas as origens de novo e atualiza os arquivos guardados.")
+    gerar.add_argument("--max-guias", type=int, metavar="N",
+                       help="Divide em partes (<origem>_parte01, ...) as origens com mais de N guias; cada parte tem "
+                            "seu numeroLote e seu hash.")
+    gerar.add_argument("--max-mb", type=float, metavar="MB",
+                       help="Divide em partes as origens cujo arquivo passaria de MB megabytes.")
+    gerar.set_defaults(funcao=comando_gerar)
+
+    validar = subparsers.add_parser("validar", help="Valida planilhas antes da geração e lista as linhas com problema.")
+    validar.add_argument("entradas", nargs="+", help="Planilhas (.xlsx ou .csv) ou pastas com planilhas.")
+    validar.add_argument("-s", "--saida", help="Relatório das linhas com problema (.xlsx ou .csv).")
+    validar.add_argument("--em-blocos", action="store_true",
+                         help="Lê a planilha aos poucos, validando cada origem assim que suas linhas terminam.")
+    validar.set_defaults(funcao=comando_validar)
+
+    for sub in (ler, gerar):
+        sub.add_argument("-w", "--workers", type=int, default=None,
+                         help="Processos em paralelo. Padrão: número de CPUs.")
+    for sub in (ler, gerar, validar):
+        sub.add_argument("-r", "--recursivo", action="store_true", help="Procura arquivos também nas subpastas.")
+        sub.add_argument("--perfil", metavar="ARQUIVO.json",
+                         help="Mede tempo, linhas e memória de cada etapa por arquivo e grava neste JSON.")
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    return args.funcao(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+from perfil import medir
+
+
+# --- Guias e procedimentos repetidos entre lotes ---
+# Procura, no consolidado de vários arquivos, a mesma guia (ou o mesmo procedimento da
+# guia) em mais de um 'Nome da Origem'. A chave de cada linha é normalizada (sem espaços
+# nas pontas, vazio no lugar de NaN) e vira um número pelo índice de hash do factorize,
+# coluna a coluna, então tudo é linear no número de linhas. Repetições dentro do mesmo
+# arquivo não entram (a guia pode ter procedimentos iguais), nem linhas sem número de guia.
+CHAVE_GUIA = ['numeroGuia_prestador', 'numeroGuia_operadora', 'identificacaoReembolso']
+CHAVES = {
+    'guia': CHAVE_GUIA,
+    'procedimento': CHAVE_GUIA + ['codigoTabela', 'grupoProcedimento', 'codigoProcedimento'],
+}
+
+# Campos do lote (cabeçalho do arquivo), que mudam a cada envio e não tornam a versão diferente
+_CAMPOS_DO_LOTE = {
+    'Nome da Origem', 'tipoTransacao', 'numeroLote', 'dataRegistroTransacao', 'dataRegistroTransacao_cabecalho',
+    'horaRegistroTransacao', 'horaRegistroTransacao_cabecalho',
+}
+
+
+# Código do valor normalizado de cada linha; -1 é vazio
+def _codigos_normalizados(serie):
+    codigos, distintos = pd.factorize(serie)
+    distintos = pd.Series(distintos, dtype=object)
+    textos = distintos.astype(str).str.strip()
+    # Quase sempre os textos já vêm limpos da leitura e os códigos do factorize servem como estão
+    if not (textos == '').any() and (textos == distintos).all():
+        return codigos
+    normalizados = pd.factorize(textos.mask(textos == ''))[0]
+    return np.append(normalizados, -1)[codigos]
+
+
+def _ids_chave(df, colunas):
+    ids = np.zeros(len(df), dtype=np.int64)
+    identificada = np.zeros(len(df), dtype=bool)
+    for coluna in colunas:
+        if coluna not in df.columns:
+            continue
+        codigos = _codigos_normalizados(df[coluna])
+        if coluna in CHAVE_GUIA:
+            identificada |= codigos != -1
+        # Combina com as colunas anteriores e renumera, então os números nunca passam do total de linhas
+        ids = pd.factorize(ids * (codigos.max(initial=-1) + 2) + codigos + 1)[0]
+    return ids, identificada
+
+
+# Pares (chave, origem) das linhas identificadas, numerados na ordem em que aparecem, e
+# quais deles têm a chave em mais de uma origem
+def _indice(df, colunas):
+    chave, identificada = _ids_chave(df, colunas)
+    origem = pd.factorize(df['Nome da Origem'])[0]
+    linhas = np.flatnonzero(identificada)
+    par = pd.factorize(chave[linhas] * (origem.max(initial=0) + 1) + origem[linhas])[0]
+    primeiras = linhas[np.flatnonzero(~pd.Series(par).duplicated().to_numpy())]
+    chave_do_par = chave[primeiras]
+    repetido = np.bincount(chave_do_par, minlength=len(df))[chave_do_par] > 1
+    return linhas, par, primeiras, chave_do_par, repetido
+
+
+# Uma linha por arquivo em que cada chave repetida aparece: quantas linhas ela tem ali, qual
+# versão é (1, 2...: arquivos com as mesmas linhas têm a mesma versão) e quantas versões há.
+# 'idêntica' quando todos os arquivos trazem o mesmo conteúdo, 'divergente' quando não.
+def detectar_duplicatas(df, nivel='procedimento'):
+    with medir('duplicatas', len(df)):
+        return _detectar(df, CHAVES[nivel])
+
+
+def _detectar(df, colunas):
+    colunas_chave = [coluna for coluna in colunas if coluna in df.columns]
+    linhas, par, primeiras, chave_do_par, repetido = _indice(df, colunas)
+    colunas_relatorio = ['Duplicata'] + colunas_chave + ['Nome da Origem', 'competenciaLote', 'Linhas', 'Versão',
+                                                         'Versões', 'Situação']
+    if not repetido.any():
+        return pd.DataFrame(columns=colunas_relatorio)
+
+    # Versão de cada par: soma (com estouro) dos hashes das linhas, que não depende da ordem delas
+    nas_repetidas = repetido[par]
+    linhas, par = linhas[nas_repetidas], par[nas_repetidas]
+    conteudo = [coluna for coluna in df.columns if coluna not in _CAMPOS_DO_LOTE]
+    hashes = pd.util.hash_pandas_object(df.iloc[linhas][conteudo], index=False).to_numpy(dtype=np.uint64)
+    versao = np.zeros(len(primeiras), dtype=np.uint64)
+    np.add.at(versao, par, hashes)
+
+    pares = pd.DataFrame({
+        'chave': chave_do_par, 'primeira': primeiras, 'versao': versao,
+        'Linhas': np.bincount(par, minlength=len(primeiras)),
+    })[repetido]
+    # Versões numeradas dentro de cada chave, na ordem em que aparecem
+    pares['versao'] = pares.groupby(['chave', 'versao'], sort=False).ngroup().to_numpy()
+    versoes = pares.drop_duplicates('versao')
+    numero = np.zeros(len(versoes), dtype=np.int64)
+    numero[versoes['versao'].to_numpy()] = versoes.groupby('chave').cumcount().to_numpy() + 1
+    pares['numero'] = numero[pares['versao'].to_numpy()]
+    pares['Versões'] = pares.groupby('chave')['numero'].transform('max')
+
+    # Agrupadas por chave, na ordem em que cada chave aparece no consolidado
+    pares['Duplicata'] = pd.factorize(pares['chave'])[0] + 1
+    pares = pares.sort_values(['Duplicata', 'primeira'], kind='stable', ignore_index=True)
+    valores = df.iloc[pares['primeira'].to_numpy()].reindex(columns=colunas_chave + ['Nome da Origem', 'competenciaLote'])
+    relatorio = pd.concat([pares[['Duplicata']], valores.reset_index(drop=True),
+                           pares[['Linhas', 'numero', 'Versões']].rename(columns={'numero': 'Versão'})], axis=1)
+    relatorio['Situação'] = np.where(relatorio['Versões'] > 1, 'divergente', 'idêntica')
+    return relatorio[colunas_relatorio]
+
+
+# Deixa cada chave repetida só no arquivo em que ela aparece primeiro ('primeira') ou por
+# último ('ultima', normalmente o reenvio corrigido); as linhas dela nos outros arquivos saem.
+# No nível 'procedimento' sai só o procedimento repetido, não a guia inteira.
+def remover_duplicatas(df, nivel='procedimento', manter='primeira'):
+    with medir('duplicatas', len(df)):
+        linhas, par, primeiras, chave_do_par, repetido = _indice(df, CHAVES[nivel])
+        ordem = np.arange(len(primeiras))
+        # Par escolhido de cada chave: o de menor (ou maior) número, que segue a ordem do consolidado
+        escolhido = np.full(len(df), -1 if manter == 'ultima' else len(primeiras), dtype=np.int64)
+        if manter == 'ultima':
+            np.maximum.at(escolhido, chave_do_par, ordem)
+        else:
+            np.minimum.at(escolhido, chave_do_par, ordem)
+        descartado = repetido & (escolhido[chave_do_par] != ordem)
+        manter_linha = np.ones(len(df), dtype=bool)
+        manter_linha[linhas[descartado[par]]] = False
+        return df[manter_linha].reset_index(drop=True)
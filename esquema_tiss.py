@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+
+
+NS_TISS = 'http://www.ans.gov.br/padroes/tiss/schemas'
+
+
+# --- Layout do Monitoramento TISS 1.05.00 ---
+# Estrutura declarativa do cabecalho e da guiaMonitoramento, na ordem em que os elementos
+# aparecem no arquivo. A geração percorre essa árvore para escrever o XML e a leitura tira
+# dela os caminhos de cada campo, então o layout fica descrito num lugar só.
+#
+# campo: `coluna` é a coluna da planilha (padrão: o próprio nome da tag); `data` converte
+# DD/MM/AAAA para AAAA-MM-DD; `obrigatorio` escreve "00" quando vazio; `ajuste(tabela)`
+# devolve a coluna inteira já com as regras de geração aplicadas.
+# grupo: `se_preenchido` só escreve o grupo se alguma dessas colunas tiver valor; `escolha`
+# escreve só o primeiro filho preenchido; `por_procedimento` repete o grupo para cada linha
+# (procedimento) da guia, em vez de usar só a primeira.
+def campo(tag, coluna=None, data=False, obrigatorio=False, ajuste=None):
+    return {'tag': tag, 'coluna': coluna or tag, 'data': data, 'obrigatorio': obrigatorio, 'ajuste': ajuste}
+
+
+def grupo(tag, *filhos, se_preenchido=(), escolha=False, por_procedimento=False):
+    return {'tag': tag, 'filhos': list(filhos), 'se_preenchido': tuple(se_preenchido),
+            'escolha': escolha, 'por_procedimento': por_procedimento}
+
+
+def eh_grupo(no):
+    return 'filhos' in no
+
+
+# Guias com origem do evento 1, 2 ou 3 não têm reembolso: vai o identificador zerado
+def _identificacao_reembolso(tabela):
+    reembolso = np.asarray(tabela['identificacaoReembolso'], dtype=object)
+    if 'origemEventoAtencao' not in tabela:
+        return reembolso
+    sem_reembolso = pd.Series(tabela['origemEventoAtencao'], dtype=object).isin(['1', '2', '3']).to_numpy()
+    return np.where(sem_reembolso, '00000000000000000000', reembolso)
+
+
+# A tabela "0" vem sem o zero à esquerda quando a planilha passa pelo Excel
+def _codigo_tabela(tabela):
+    codigo = np.asarray(tabela['codigoTabela'], dtype=object)
+    return np.where(codigo == '0', '00', codigo)
+
+
+CABECALHO = grupo(
+    'cabecalho',
+    grupo(
+        'identificacaoTransacao',
+        campo('tipoTransacao'),
+        campo('numeroLote'),
+        campo('competenciaLote'),
+        campo('dataRegistroTransacao'),
+        campo('horaRegistroTransacao'),
+    ),
+    campo('registroANS', 'registroANS_cabecalho'),
+    campo('versaoPadrao', 'versaoPadrao_cabecalho'),
+)
+
+PROCEDIMENTOS = grupo(
+    'procedimentos',
+    grupo(
+        'identProcedimento',
+        campo('codigoTabela', ajuste=_codigo_tabela),
+        grupo('Procedimento', campo('grupoProcedimento'), campo('codigoProcedimento'), escolha=True),
+    ),
+    campo('quantidadeInformada'),
+    campo('valorInformado', obrigatorio=True),
+    campo('quantidadePaga'),
+    campo('unidadeMedida'),
+    campo('valorPagoProc'),
+    campo('valorPagoFornecedor', obrigatorio=True),
+    campo('valorCoParticipacao'),
+    se_preenchido=('codigoProcedimento', 'grupoProcedimento'),
+    por_procedimento=True,
+)
+
+GUIA = grupo(
+    'guiaMonitoramento',
+    campo('tipoRegistro'),
+    campo('versaoTISSPrestador'),
+    campo('formaEnvio'),
+    grupo(
+        'dadosContratadoExecutante',
+        campo('CNES'),
+        campo('identificadorExecutante'),
+        campo('codigoCNPJ_CPF'),
+        campo('municipioExecutante'),
+    ),
+    campo('registroANSOperadoraIntermediaria'),
+    campo('tipoAtendimentoOperadoraIntermediaria'),
+    grupo(
+        'dadosBeneficiario',
+        grupo(
+            'identBeneficiario',
+            campo('numeroCartaoNacionalSaude'),
+            campo('cpfBeneficiario'),
+            campo('sexo'),
+            campo('dataNascimento', data=True),
+            campo('municipioResidencia'),
+        ),
+        campo('numeroRegistroPlano'),
+    ),
+    campo('tipoEventoAtencao'),
+    campo('origemEventoAtencao'),
+    campo('numeroGuia_prestador', obrigatorio=True),
+    campo('numeroGuia_operadora', obrigatorio=True),
+    campo('identificacaoReembolso', ajuste=_identificacao_reembolso),
+    grupo(
+        'formasRemuneracao',
+        campo('formaRemuneracao'),
+        campo('valorRemuneracao'),
+        se_preenchido=('formaRemuneracao', 'valorRemuneracao'),
+    ),
+    campo('guiaSolicitacaoInternacao'),
+    campo('dataSolicitacao', data=True),
+    campo('numeroGuiaSPSADTPrincipal'),
+    campo('dataAutorizacao', data=True),
+    campo('dataRealizacao', data=True),
+    campo('dataInicialFaturamento', data=True),
+    campo('dataFimPeriodo', data=True),
+    campo('dataProtocoloCobranca', data=True),
+    campo('dataPagamento', data=True),
+    campo('dataProcessamentoGuia', data=True),
+    campo('tipoConsulta'),
+    campo('cboExecutante'),
+    campo('indicacaoRecemNato'),
+    campo('indicacaoAcidente'),
+    campo('caraterAtendimento'),
+    campo('tipoInternacao'),
+    campo('regimeInternacao'),
+    grupo('diagnosticosCID10', campo('diagnosticoCID'), se_preenchido=('diagnosticoCID',)),
+    campo('tipoAtendimento'),
+    campo('regimeAtendimento'),
+    campo('tipoFaturamento'),
+    campo('diariasAcompanhante'),
+    campo('diariasUTI'),
+    campo('motivoSaida'),
+    grupo(
+        'valoresGuia',
+        campo('valorTotalInformado'),
+        campo('valorProcessado'),
+        campo('valorTotalPagoProcedimentos'),
+        campo('valorTotalDiarias'),
+        campo('valorTotalTaxas'),
+        campo('valorTotalMateriais'),
+        campo('valorTotalOPME'),
+        campo('valorTotalMedicamentos'),
+        campo('valorGlosaGuia'),
+        campo('valorPagoGuia'),
+        campo('valorPagoFornecedores'),
+        campo('valorTotalTabelaPropria'),
+        campo('valorTotalCoParticipacao'),
+    ),
+    campo('declaracaoNascido'),
+    campo('declaracaoObito'),
+    PROCEDIMENTOS,
+)
+
+
+# Todos os campos (folhas) abaixo de `no`, na ordem do layout
+def campos(no):
+    resultado = []
+    for filho in no['filhos']:
+        resultado.extend(campos(filho) if eh_grupo(filho) else [filho])
+    return resultado
+
+
+# Lista (tag, caminho relativo ao grupo) de todos os campos abaixo de `no`, no formato
+# usado pelo findtext do ElementTree (prefixo "ans:").
+def caminhos(no, prefixo=''):
+    resultado = []
+    for filho in no['filhos']:
+        caminho = f"{prefixo}ans:{filho['tag']}"
+        if eh_grupo(filho):
+            resultado.extend(caminhos(filho, caminho + '/'))
+        else:
+            resultado.append((filho['tag'], caminho))
+    return resultado
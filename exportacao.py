@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+from perfil import medir
+from tipagem_xte import restaurar_texto
+
+
+# --- Exportação do consolidado em blocos ---
+# Excel, CSV e Parquet são escritos aos poucos, `TAMANHO_BLOCO_EXPORTACAO` linhas por vez,
+# direto no destino (arquivo ou temporário): nunca existe uma cópia inteira do arquivo na
+# memória além do próprio DataFrame. DataFrames do modo compacto voltam a texto bloco a
+# bloco (restaurar_texto), então todos os formatos saem com os mesmos valores.
+TAMANHO_BLOCO_EXPORTACAO = 50_000
+
+# Limite do Excel por aba, contando a linha do cabeçalho
+LIMITE_LINHAS_EXCEL = 1_048_576
+
+_LINHA_FINA = Side(style="thin")
+_ESTILO_CABECALHO = {
+    "font": Font(bold=True),
+    "border": Border(left=_LINHA_FINA, right=_LINHA_FINA, top=_LINHA_FINA, bottom=_LINHA_FINA),
+    "alignment": Alignment(horizontal="center", vertical="top"),
+}
+
+
+def _blocos(df, inicio=0, fim=None, tamanho=TAMANHO_BLOCO_EXPORTACAO):
+    fim = len(df) if fim is None else fim
+    for posicao in range(inicio, fim, tamanho):
+        yield restaurar_texto(df.iloc[posicao:min(posicao + tamanho, fim)])
+
+
+def partes_excel(total_linhas, linhas_por_parte=LIMITE_LINHAS_EXCEL - 1):
+    # Intervalos [inicio, fim) de cada aba/arquivo; sempre pelo menos um (só o cabeçalho)
+    return [(inicio, min(inicio + linhas_por_parte, total_linhas))
+            for inicio in range(0, max(total_linhas, 1), linhas_por_parte)]
+
+
+def _cabecalho(ws, colunas):
+    linha = []
+    for coluna in colunas:
+        celula = WriteOnlyCell(ws, value=str(coluna))
+        for atributo, valor in _ESTILO_CABECALHO.items():
+            setattr(celula, atributo, valor)
+        linha.append(celula)
+    return linha
+
+
+# Mesmo conteúdo do df.to_excel(index=False) (cabeçalho em negrito, vazios sem valor),
+# mas com o openpyxl em modo write_only: as linhas vão para disco conforme são escritas.
+# Passando de `linhas_por_aba`, continua em novas abas (Sheet1, Sheet2, ...).
+def exportar_excel(df, destino, linhas_por_aba=LIMITE_LINHAS_EXCEL - 1, inicio=0, fim=None):
+    fim = len(df) if fim is None else fim
+    with medir("exportacao", fim - inicio):
+        wb = Workbook(write_only=True)
+        for numero, (inicio_aba, fim_aba) in enumerate(partes_excel(fim - inicio, linhas_por_aba), start=1):
+            ws = wb.create_sheet(f"Sheet{numero}")
+            ws.append(_cabecalho(ws, df.columns))
+            for bloco in _blocos(df, inicio + inicio_aba, inicio + fim_aba):
+                bloco = bloco.astype(object).where(bloco.notna(), None)
+                for linha in bloco.itertuples(index=False, name=None):
+                    ws.append(linha)
+        wb.save(destino)
+    return destino
+
+
+# Um .xlsx por parte dentro de um ZIP, para quem prefere arquivos separados a várias abas
+def exportar_excel_em_arquivos(df, destino, nome_base="dados_consolidados", linhas_por_arquivo=LIMITE_LINHAS_EXCEL - 1):
+    partes = partes_excel(len(df), linhas_por_arquivo)
+    # O .xlsx já é compactado, então as partes entram no ZIP sem nova compressão
+    with zipfile.ZipFile(destino, "w") as zipf:
+        for numero, (inicio, fim) in enumerate(partes, start=1):
+            # O openpyxl precisa de destino com seek; cada parte passa por um temporário
+            with tempfile.TemporaryFile() as temporario:
+                exportar_excel(df, temporario, linhas_por_aba=linhas_por_arquivo, inicio=inicio, fim=fim)
+                temporario.seek(0)
+                with medir("zip"), zipf.open(f"{nome_base}_{numero}.xlsx", "w", force_zip64=True) as saida:
+                    shutil.copyfileobj(temporario, saida)
+    return destino
+
+
+# Mesmo texto do df.to_csv(index=False, sep=";", float_format='%.2f'), gerado em blocos
+def exportar_csv(df, destino, encoding="utf-8"):
+    saida = open(destino, "wb") if isinstance(destino, (str, os.PathLike)) else destino
+    try:
+        with medir("exportacao", len(df)):
+            cabecalho = True
+            for bloco in _blocos(df):
+                texto = bloco.to_csv(index=False, header=cabecalho, sep=";", float_format='%.2f')
+                saida.write(texto.encode(encoding))
+                cabecalho = False
+            if cabecalho:
+                saida.write(df.iloc[:0].to_csv(index=False, sep=";").encode(encoding))
+    finally:
+        if saida is not destino:
+            saida.close()
+    return destino
+
+
+# Tipo Arrow das colunas object pelo conteúdo: no consolidado, 'Idade_na_Realização' tem
+# números de um lote e vazios de outro. Se o primeiro bloco só tem vazios, olha a coluna toda.
+_TIPOS_INFERIDOS = {"integer": pa.int64(), "floating": pa.float64(), "mixed-integer-float": pa.float64(),
+                    "boolean": pa.bool_()}
+
+
+def _tipo_object(bloco, df, coluna):
+    inferido = pd.api.types.infer_dtype(bloco[coluna], skipna=True)
+    if inferido == "empty":
+        inferido = pd.api.types.infer_dtype(restaurar_texto(df[[coluna]])[coluna], skipna=True)
+    return _TIPOS_INFERIDOS.get(inferido, pa.string())
+
+
+# Colunas de texto viram string no Parquet; as numéricas mantêm o tipo
+def _schema_parquet(bloco, df):
+    campos = []
+    for coluna in bloco.columns:
+        dtype = bloco[coluna].dtype
+        if dtype == object:
+            tipo = _tipo_object(bloco, df, coluna)
+        elif isinstance(dtype, pd.CategoricalDtype):
+            tipo = pa.string()
+        elif isinstance(dtype, pd.Int64Dtype):
+            tipo = pa.int64()
+        else:
+            tipo = pa.from_numpy_dtype(np.dtype(dtype))
+        campos.append(pa.field(str(coluna), tipo))
+    return pa.schema(campos)
+
+
+def exportar_parquet(df, destino):
+    schema = None
+    escritor = None
+    try:
+        with medir("exportacao", len(df)):
+            for bloco in _blocos(df):
+                if schema is None:
+                    schema = _schema_parquet(bloco, df)
+                    escritor = pq.ParquetWriter(destino, schema, compression="zstd")
+                escritor.write_table(pa.Table.from_pandas(bloco, schema=schema, preserve_index=False))
+            if escritor is None:
+                pq.write_table(pa.Table.from_pandas(df.iloc[:0], preserve_index=False), destino)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return destino
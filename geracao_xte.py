@@ -0,0 +1,707 @@
+import hashlib
+import io
+import os
+import re
+import shutil
+import zipfile
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pytz
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
+
+from cache_xte import gravar_gerado, ler_gerado
+from esquema_tiss import CABECALHO, GUIA, NS_TISS, eh_grupo
+from paralelo import chamar, iterar_em_paralelo
+from perfil import ColetorPerfil, ativar, com_perfil, medir, medir_iteracao, perfilar
+
+
+ATRIBUTOS_RAIZ = [
+    ("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance"),
+    ("xmlns:xsd", "http://www.w3.org/2001/XMLSchema"),
+    ("xmlns:ans", NS_TISS),
+    ("xsi:schemaLocation", f"{NS_TISS} {NS_TISS}/tissMonitoramentoV1_05_00.xsd"),
+]
+
+# Caracteres que o XML não aceita; a geração antiga falhava ao reler o XML nesses casos
+_CARACTERES_INVALIDOS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+# --- Escritor de XML em streaming ---
+# Escreve elemento a elemento, já indentado e em ISO-8859-1, exatamente no formato que o
+# minidom.toprettyxml(indent="  ", encoding="iso-8859-1") produzia: um elemento por linha,
+# texto na mesma linha da tag e "<tag/>" para elemento sem filhos. Não monta árvore.
+# O MD5 do epílogo é alimentado a cada campo escrito, sem percorrer o conteúdo de novo.
+# Com `nivel`, escreve um fragmento (guias de um lote dividido em partes): sem declaração,
+# já `nivel` elementos para dentro, e guardando os textos do hash em vez de calcular o MD5;
+# quem monta o arquivo inclui o fragmento com `incluir`.
+class EscritorXTE:
+    def __init__(self, saida, indentacao="  ", nivel=0):
+        self.saida = io.TextIOWrapper(saida, encoding="iso-8859-1", errors="xmlcharrefreplace", newline="\n")
+        self.indentacao = indentacao
+        self.pilha = [None] * nivel
+        self.pendente = False
+        if nivel:
+            self.hash = _TextosDoHash()
+        else:
+            self.hash = hashlib.md5()
+            self.saida.write('<?xml version="1.0" encoding="iso-8859-1"?>\n')
+
+    def _fechar_pendente(self):
+        if self.pendente:
+            self.saida.write(">\n")
+            self.pendente = False
+
+    def abrir(self, tag, atributos=()):
+        self._fechar_pendente()
+        attrs = "".join(f' {nome}="{_escapar(valor)}"' for nome, valor in atributos)
+        self.saida.write(f"{self.indentacao * len(self.pilha)}<{tag}{attrs}")
+        self.pilha.append(tag)
+        # Só dá para saber se é "<tag/>" quando o primeiro filho (ou o fechamento) chegar
+        self.pendente = True
+
+    def campo(self, tag, texto, hash=True):
+        if _CARACTERES_INVALIDOS.search(texto):
+            raise ValueError(f"Caractere inválido para XML no campo '{tag}': {texto!r}")
+        self._fechar_pendente()
+        if hash:
+            self.hash.update(texto.encode("iso-8859-1"))
+        # O parser de XML converte quebras \r\n e \r em \n
+        texto_xml = texto.replace("\r\n", "\n").replace("\r", "\n")
+        self.saida.write(f"{self.indentacao * len(self.pilha)}<{tag}>{_escapar(texto_xml)}</{tag}>\n")
+
+    def fechar(self):
+        tag = self.pilha.pop()
+        if self.pendente:
+            self.saida.write("/>\n")
+            self.pendente = False
+        else:
+            self.saida.write(f"{self.indentacao * len(self.pilha)}</{tag}>\n")
+
+    # Trecho já serializado (ISO-8859-1) por um escritor de fragmento e os textos do hash dele
+    def incluir(self, xml, textos_hash):
+        self._fechar_pendente()
+        self.hash.update(textos_hash)
+        self.saida.flush()
+        self.saida.buffer.write(xml)
+
+    def finalizar(self):
+        self.saida.flush()
+        return self.saida.detach()
+
+
+class _TextosDoHash:
+    def __init__(self):
+        self.textos = bytearray()
+
+    def update(self, dados):
+        self.textos += dados
+
+
+def _escapar(texto):
+    return texto.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+
+# --- Função Auxiliar 'sub' ---
+def sub(escritor, tag, value, is_date=False, force=False):
+    _escrever_campo(escritor, f"ans:{tag}", value, is_date, force)
+
+
+def _escrever_campo(escritor, tag, valor, data=False, obrigatorio=False):
+    # As células da planilha são sempre texto ou NaN; o resto passa pelo caminho genérico
+    if valor.__class__ is str:
+        texto = valor.strip()
+    elif valor is None or pd.isna(valor):
+        texto = ""
+    else:
+        texto = str(valor).strip()
+    if not texto:
+        if obrigatorio:
+            escritor.campo(tag, "00")
+        return
+    if data:
+        texto = _data_iso(texto)
+    escritor.campo(tag, texto)
+
+
+# Datas se repetem muito no lote, então cada texto distinto é convertido uma vez só
+@lru_cache(maxsize=65536)
+def _data_iso(texto):
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(texto, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return texto
+
+
+def _preenchido(valor):
+    return valor.__class__ is str or not (valor is None or pd.isna(valor))
+
+
+# --- Layout compilado ---
+# Troca os nomes de coluna do esquema (esquema_tiss) pela posição do valor na tupla da
+# linha. As colunas usadas são copiadas para `colunas` (com os ajustes já aplicados) e as
+# linhas viram tuplas simples, sem Series do pandas no laço de geração.
+_CAMPO, _GRUPO = 0, 1
+
+
+def _compilar(no, tabela, colunas, posicoes):
+    def posicao(coluna, ajuste=None):
+        if coluna not in tabela:
+            return None
+        chave = (coluna, ajuste)
+        if chave not in posicoes:
+            valores = ajuste(tabela) if ajuste else tabela[coluna]
+            posicoes[chave] = len(colunas)
+            colunas.append(np.asarray(valores, dtype=object))
+        return posicoes[chave]
+
+    if not eh_grupo(no):
+        return (_CAMPO, f"ans:{no['tag']}", posicao(no['coluna'], no['ajuste']), no['data'], no['obrigatorio'])
+    filhos = [_compilar(filho, tabela, colunas, posicoes) for filho in no['filhos']]
+    condicao = [i for i in map(posicao, no['se_preenchido']) if i is not None]
+    return (_GRUPO, f"ans:{no['tag']}", filhos, condicao, bool(no['se_preenchido']),
+            no['escolha'], no['por_procedimento'])
+
+
+def compilar_layout(no, tabela):
+    colunas = []
+    compilado = _compilar(no, tabela, colunas, {})
+    return compilado, list(zip(*colunas))
+
+
+def _escrever_no(x, no, linhas):
+    linha = linhas[0]
+    if no[0] == _CAMPO:
+        _, tag, i, data, obrigatorio = no
+        _escrever_campo(x, tag, None if i is None else linha[i], data, obrigatorio)
+        return
+
+    _, tag, filhos, condicao, condicional, escolha, por_procedimento = no
+    for linha in (linhas if por_procedimento else (linha,)):
+        if condicional and not any(_preenchido(linha[i]) for i in condicao):
+            continue
+        x.abrir(tag)
+        if escolha:
+            for filho in filhos:
+                if filho[2] is not None and _preenchido(linha[filho[2]]):
+                    _escrever_no(x, filho, (linha,))
+                    break
+        else:
+            for filho in filhos:
+                _escrever_no(x, filho, linhas if not por_procedimento else (linha,))
+        x.fechar()
+
+
+# --- Setup de Data/Hora compartilhado por todos os arquivos do lote ---
+def carimbo_transacao():
+    fuso_horario_servidor = pytz.utc
+    fuso_horario_desejado = pytz.timezone("America/Sao_Paulo")
+    agora_no_fuso_desejado = datetime.now(fuso_horario_servidor).astimezone(fuso_horario_desejado)
+    return {
+        "data_atual": agora_no_fuso_desejado.strftime("%Y-%m-%d"),
+        "hora_atual": agora_no_fuso_desejado.strftime("%H:%M:%S"),
+        # AJUSTE FINAL: Trocando Hora (%H) por Minuto (%M) na composição do lote.
+        "minuto_e_segundos_atuais": agora_no_fuso_desejado.strftime("%M%S"),
+        "ano_e_mes_atuais": agora_no_fuso_desejado.strftime("%Y%m"),
+    }
+
+
+def nome_arquivo_saida(nome_arquivo):
+    nome_base, _ = os.path.splitext(nome_arquivo)
+    return re.sub(r'[^a-zA-Z0-9_\-]', '_', nome_base)
+
+
+# Abre o arquivo até a lista de guias: raiz, cabeçalho, Mensagem e operadoraParaANS. Nas
+# partes de um lote dividido, o número da parte (2 dígitos) vai no fim do numeroLote.
+def _abrir_lote(x, linha_cabecalho, carimbo, parte=None):
+    x.abrir("ans:mensagemEnvioANS", ATRIBUTOS_RAIZ)
+
+    # --- Bloco do Cabeçalho ---
+    # AJUSTE FINAL: Geração do numeroLote com Minuto e Segundo
+    competencia = linha_cabecalho.get("competenciaLote", "")
+    if competencia and len(competencia) == 6 and competencia.isdigit():
+        numero_lote_final = f"{competencia}{carimbo['minuto_e_segundos_atuais']}"
+    else:
+        numero_lote_final = f"{carimbo['ano_e_mes_atuais']}{carimbo['minuto_e_segundos_atuais']}"
+    if parte is not None:
+        numero_lote_final = f"{numero_lote_final}{parte:02d}"
+
+    valores_cabecalho = {
+        "tipoTransacao": ["MONITORAMENTO"],
+        "numeroLote": [numero_lote_final],
+        "competenciaLote": [linha_cabecalho.get("competenciaLote")],
+        "dataRegistroTransacao": [carimbo["data_atual"]],
+        "horaRegistroTransacao": [carimbo["hora_atual"]],
+        "registroANS_cabecalho": [linha_cabecalho.get("registroANS_cabecalho")],
+        "versaoPadrao_cabecalho": [linha_cabecalho.get("versaoPadrao_cabecalho", "1.05.00")],
+    }
+    cabecalho, linhas_cabecalho = compilar_layout(CABECALHO, valores_cabecalho)
+    _escrever_no(x, cabecalho, linhas_cabecalho)
+
+    x.abrir("ans:Mensagem")
+    x.abrir("ans:operadoraParaANS")
+
+
+def _fechar_lote(x):
+    x.fechar()
+    x.fechar()
+
+    # --- Finalização com Hash ---
+    # O hash cobre o texto de todos os campos do cabecalho e da Mensagem, na ordem do arquivo
+    x.abrir("ans:epilogo")
+    with medir("hash"):
+        x.campo("ans:hash", x.hash.hexdigest(), hash=False)
+    x.fechar()
+    x.fechar()
+
+
+# Posições das linhas na ordem das guias e onde cada guia começa (fora a primeira). As guias
+# saem na ordem do groupby (chaves ordenadas, vazias por último).
+def _ordem_das_guias(df):
+    numero_guia = df.groupby(
+        ["numeroGuia_prestador", "numeroGuia_operadora", "identificacaoReembolso"], dropna=False
+    ).ngroup().to_numpy()
+    ordem = np.argsort(numero_guia, kind="stable")
+    limites = np.flatnonzero(np.diff(numero_guia[ordem])) + 1
+    return ordem, limites
+
+
+def gerar_arquivo_xte(df_origem, carimbo):
+    saida = io.BytesIO()
+    x = EscritorXTE(saida)
+    _abrir_lote(x, df_origem.iloc[0], carimbo)
+
+    # --- Loop Principal para cada Guia ---
+    # Cada guia usa a primeira linha para os campos da guia e todas as linhas para os procedimentos
+    with medir("dataframe", len(df_origem)):
+        guia, linhas = compilar_layout(GUIA, df_origem)
+        ordem, limites = _ordem_das_guias(df_origem)
+    # No perfil, a conversão das datas e o MD5 (alimentado campo a campo) entram na serialização
+    with medir("serializacao", len(df_origem)):
+        for posicoes in np.split(ordem, limites):
+            _escrever_no(x, guia, [linhas[p] for p in posicoes])
+
+    _fechar_lote(x)
+    return x.finalizar().getvalue()
+
+
+# --- Lotes divididos em partes ---
+# Com limite de guias e/ou de bytes por arquivo, as guias de cada origem vão em blocos de
+# TAMANHO_BLOCO_GUIAS para o pool, que serializa cada bloco como fragmento (as guias
+# já indentadas e os textos delas que entram no hash). O processo principal junta guias
+# inteiras, na ordem, até o limite e monta cada parte com cabeçalho próprio (numeroLote
+# com o número da parte) e o MD5 dela no epílogo; nada é serializado de novo. Uma guia
+# maior que o limite de bytes vai sozinha para uma parte. A origem que cabe num arquivo
+# só sai com o mesmo nome e o mesmo conteúdo da geração sem divisão.
+TAMANHO_BLOCO_GUIAS = 2_000
+
+# O número da parte ocupa 2 dígitos no fim do numeroLote (12 caracteres no total)
+MAXIMO_PARTES = 99
+
+
+def nome_parte(nome, parte):
+    return f"{nome}_parte{parte:02d}"
+
+
+# Posições das linhas de cada bloco, com as guias na ordem da geração
+def _blocos_de_guias(df_origem, tamanho_bloco=TAMANHO_BLOCO_GUIAS):
+    ordem, limites = _ordem_das_guias(df_origem)
+    return np.split(ordem, limites[tamanho_bloco - 1::tamanho_bloco])
+
+
+# Worker: (xml, fim de cada guia no xml, textos do hash, fim de cada guia nos textos)
+def gerar_fragmento_guias(df_bloco):
+    saida = io.BytesIO()
+    x = EscritorXTE(saida, nivel=3)
+    with medir("dataframe", len(df_bloco)):
+        guia, linhas = compilar_layout(GUIA, df_bloco)
+        ordem, limites = _ordem_das_guias(df_bloco)
+    fins_xml, fins_textos = [], []
+    with medir("serializacao", len(df_bloco)):
+        for posicoes in np.split(ordem, limites):
+            _escrever_no(x, guia, [linhas[p] for p in posicoes])
+            x.saida.flush()
+            fins_xml.append(saida.tell())
+            fins_textos.append(len(x.hash.textos))
+    return x.finalizar().getvalue(), fins_xml, bytes(x.hash.textos), fins_textos
+
+
+# Monta as partes de uma origem a partir dos fragmentos dos `blocos` dela, recebidos na ordem
+class DivisorLote:
+    def __init__(self, nome, linha_cabecalho, carimbo, blocos, max_guias=None, max_bytes=None):
+        self.nome = nome
+        self.linha_cabecalho = linha_cabecalho
+        self.carimbo = carimbo
+        self.blocos_restantes = blocos
+        self.max_guias = max_guias
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.partes = 0
+        # Cabeçalho, fechamentos e epílogo de uma parte, com o numeroLote mais longo (o de parte).
+        # Com um trecho vazio, para operadoraParaANS não sair como "<tag/>".
+        self.guias = [(b"", b"")]
+        self.tamanho_fixo = len(self._montar(1))
+        self.guias = []
+
+    def _montar(self, parte):
+        x = EscritorXTE(io.BytesIO())
+        _abrir_lote(x, self.linha_cabecalho, self.carimbo, parte)
+        for xml, textos in self.guias:
+            x.incluir(xml, textos)
+        _fechar_lote(x)
+        return x.finalizar().getvalue()
+
+    def _cabe(self, tamanho):
+        if self.max_guias and len(self.guias) >= self.max_guias:
+            return False
+        return not self.max_bytes or self.tamanho_fixo + self.bytes + tamanho <= self.max_bytes
+
+    def _fechar_parte(self):
+        self.partes += 1
+        if self.partes > MAXIMO_PARTES:
+            raise ValueError(f"A origem '{self.nome}' passaria de {MAXIMO_PARTES} partes; aumente o limite por arquivo.")
+        conteudo = self._montar(self.partes)
+        self.guias, self.bytes = [], 0
+        return nome_parte(self.nome, self.partes), conteudo
+
+    # Recebe o fragmento do próximo bloco e devolve as partes (nome, conteúdo) completadas
+    def acrescentar(self, fragmento):
+        xml, fins_xml, textos, fins_textos = fragmento
+        prontas = []
+        inicio_xml = inicio_textos = 0
+        for fim_xml, fim_textos in zip(fins_xml, fins_textos):
+            tamanho = fim_xml - inicio_xml
+            if self.guias and not self._cabe(tamanho):
+                prontas.append(self._fechar_parte())
+            self.guias.append((xml[inicio_xml:fim_xml], textos[inicio_textos:fim_textos]))
+            self.bytes += tamanho
+            inicio_xml, inicio_textos = fim_xml, fim_textos
+
+        self.blocos_restantes -= 1
+        if self.blocos_restantes == 0:
+            if self.partes:
+                prontas.append(self._fechar_parte())
+            else:
+                prontas.append((self.nome, self._montar(None)))
+        return prontas
+
+    @property
+    def concluido(self):
+        return self.blocos_restantes == 0
+
+
+# No armazenamento de arquivos gerados, as partes de uma origem ficam juntas num ZIP
+# (membros numerados, sem o nome da origem, que não entra na assinatura)
+def _juntar_partes(partes):
+    arquivo = io.BytesIO()
+    with zipfile.ZipFile(arquivo, "w") as zipf:
+        for i, (_, conteudo) in enumerate(partes):
+            zipf.writestr(f"{i + 1:02d}", conteudo)
+    return arquivo.getvalue()
+
+
+def _separar_partes(nome, conteudo):
+    with zipfile.ZipFile(io.BytesIO(conteudo)) as zipf:
+        conteudos = [zipf.read(membro) for membro in zipf.namelist()]
+    if len(conteudos) == 1:
+        return [(nome, conteudos[0])]
+    return [(nome_parte(nome, i + 1), parte) for i, parte in enumerate(conteudos)]
+
+
+# --- Assinatura da origem (reaproveitamento de arquivos já gerados) ---
+# Resume as linhas da origem como a geração as enxerga: valores sem espaços nas pontas,
+# vazio no lugar de NaN, colunas em ordem alfabética e sem as colunas totalmente vazias.
+# 'Nome da Origem' fica de fora, então renomear a origem não muda a assinatura. Cada linha
+# vira um hash de 64 bits (hash_pandas_object) e o SHA-256 cobre a sequência das linhas.
+# Aumentar VERSAO_GERACAO quando a geração mudar o conteúdo dos arquivos.
+VERSAO_GERACAO = 1
+
+
+def _normalizar(serie):
+    return serie.astype(object).where(serie.notna(), "").astype(str).str.strip()
+
+
+def assinatura_origem(df_origem):
+    normalizado = {}
+    for coluna in sorted(c for c in df_origem.columns if c != "Nome da Origem"):
+        valores = _normalizar(df_origem[coluna])
+        if (valores != "").any():
+            normalizado[coluna] = valores.to_numpy()
+    normalizado = pd.DataFrame(normalizado, index=pd.RangeIndex(len(df_origem)))
+    assinatura = hashlib.sha256("\0".join([f"v{VERSAO_GERACAO}"] + list(normalizado.columns)).encode("utf-8"))
+    assinatura.update(pd.util.hash_pandas_object(normalizado, index=False).to_numpy().tobytes())
+    return assinatura.hexdigest()
+
+
+def _eh_csv(excel_file):
+    return hasattr(excel_file, 'name') and excel_file.name.endswith('.csv')
+
+
+def ler_planilha(excel_file):
+    # Planilha já lida (e validada antes da geração, por exemplo) passa direto
+    if isinstance(excel_file, pd.DataFrame):
+        return excel_file
+    if _eh_csv(excel_file):
+        return pd.read_csv(excel_file, dtype=str, sep=';')
+    return pd.read_excel(excel_file, dtype=str)
+
+
+# --- Leitura da planilha em blocos (planilhas grandes) ---
+# Quantidade de linhas da planilha lidas por vez no modo em blocos
+TAMANHO_BLOCO_PLANILHA = 20_000
+
+
+# Mesma conversão de célula que o pd.read_excel faz com o openpyxl
+def _valor_celula(celula):
+    if celula.value is None:
+        return ""
+    if celula.data_type == TYPE_ERROR:
+        return np.nan
+    if celula.data_type == TYPE_NUMERIC:
+        inteiro = int(celula.value)
+        return inteiro if inteiro == celula.value else float(celula.value)
+    return celula.value
+
+
+def _linhas_xlsx(excel_file):
+    wb = load_workbook(excel_file, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb.worksheets[0]
+        ws.reset_dimensions()
+        for linha in ws.rows:
+            yield [_valor_celula(celula) for celula in linha]
+    finally:
+        wb.close()
+
+
+# Cada bloco passa pelo mesmo TextParser do read_excel (vazios viram NaN, o resto texto).
+# Colunas além do cabeçalho são ignoradas.
+def _blocos_xlsx(excel_file, tamanho_bloco):
+    linhas = _linhas_xlsx(excel_file)
+    cabecalho = next(linhas, [])
+    while cabecalho and cabecalho[-1] == "":
+        cabecalho.pop()
+    largura = len(cabecalho)
+
+    # O índice continua de um bloco para o outro, como no read_csv em blocos
+    inicio = 0
+
+    def bloco(linhas_bloco):
+        df = TextParser([cabecalho] + linhas_bloco, header=0, dtype=str).read()
+        df.index = pd.RangeIndex(inicio, inicio + len(df))
+        return df
+
+    linhas_bloco = []
+    for linha in linhas:
+        linhas_bloco.append((linha + [""] * largura)[:largura])
+        if len(linhas_bloco) >= tamanho_bloco:
+            yield bloco(linhas_bloco)
+            inicio += len(linhas_bloco)
+            linhas_bloco = []
+    if linhas_bloco:
+        yield bloco(linhas_bloco)
+
+
+def ler_planilha_em_blocos(excel_file, tamanho_bloco=TAMANHO_BLOCO_PLANILHA):
+    if _eh_csv(excel_file):
+        yield from pd.read_csv(excel_file, dtype=str, sep=';', chunksize=tamanho_bloco)
+    else:
+        yield from _blocos_xlsx(excel_file, tamanho_bloco)
+
+
+# Junta as linhas de cada "Nome da Origem" conforme os blocos chegam e entrega a origem
+# assim que aparece a próxima (ou a planilha acaba). Exige as linhas de cada origem em
+# sequência, como a exportação XTE -> Excel produz; linhas sem origem são ignoradas.
+def origens_em_sequencia(blocos):
+    atual = None
+    partes = []
+    concluidas = set()
+    for bloco in blocos:
+        if "Nome da Origem" not in bloco.columns:
+            raise ValueError("A coluna 'Nome da Origem' é obrigatória no Excel.")
+        bloco = bloco[bloco["Nome da Origem"].notna()]
+        if bloco.empty:
+            continue
+        origem = bloco["Nome da Origem"].to_numpy()
+        inicios = np.flatnonzero(np.r_[True, origem[1:] != origem[:-1]])
+        for inicio, fim in zip(inicios, np.r_[inicios[1:], len(origem)]):
+            nome = origem[inicio]
+            if nome != atual:
+                if partes:
+                    yield atual, pd.concat(partes)
+                    concluidas.add(atual)
+                if nome in concluidas:
+                    raise ValueError(
+                        f"As linhas da origem '{nome}' não estão em sequência na planilha. "
+                        "Ordene a planilha por 'Nome da Origem' ou desative a leitura em blocos."
+                    )
+                atual, partes = nome, []
+            partes.append(bloco.iloc[inicio:fim])
+    if partes:
+        yield atual, pd.concat(partes)
+
+
+# Cada "Nome da Origem" vira um arquivo independente; só o carimbo (data/hora e sufixo do
+# numeroLote) é compartilhado, e ele é calculado uma vez aqui e enviado a todos os processos.
+# Gera (nome_limpo, conteudo) na ordem do groupby, qualquer que seja a ordem de conclusão,
+# entregando cada arquivo assim que fica pronto.
+# Com `em_blocos`, a planilha é lida aos poucos e cada origem é gerada assim que suas linhas
+# terminam: os arquivos saem na ordem em que as origens aparecem na planilha e a memória
+# fica limitada a algumas origens por vez, não à planilha inteira.
+# `perfil` (lista) recebe os tempos por etapa da planilha e de cada arquivo (perfil.py).
+# Com `reaproveitar`, cada origem cuja assinatura já foi gerada antes sai do armazenamento
+# local (cache_xte) sem ir para o pool, e as geradas agora são guardadas lá; `forcar` gera
+# todas de novo e atualiza o armazenamento. Os nomes reaproveitados vão para `reaproveitados`.
+# Com `max_guias` e/ou `max_bytes`, as origens maiores que o limite saem em partes
+# (DivisorLote), "<nome>_parte01", "<nome>_parte02"..., cada uma com seu numeroLote e hash.
+def iterar_xte_do_excel(excel_file, max_workers=1, em_blocos=False, perfil=None, reaproveitar=False, forcar=False,
+                        reaproveitados=None, max_guias=None, max_bytes=None):
+    carimbo = carimbo_transacao()
+    planilha = ColetorPerfil(getattr(excel_file, "name", "planilha"))
+    dividir = bool(max_guias or max_bytes)
+
+    if em_blocos:
+        origens = medir_iteracao(origens_em_sequencia(ler_planilha_em_blocos(excel_file)), "leitura_planilha",
+                                 planilha, linhas=lambda origem: len(origem[1]))
+    else:
+        with ativar(planilha), medir("leitura_planilha") as medida:
+            df = ler_planilha(excel_file)
+            medida["linhas"] = len(df)
+
+        if "Nome da Origem" not in df.columns:
+            raise ValueError("A coluna 'Nome da Origem' é obrigatória no Excel.")
+
+        # --- Início da Geração do XML ---
+        with ativar(planilha), medir("dataframe", len(df)):
+            origens = [(nome_arquivo, df_origem) for nome_arquivo, df_origem in df.groupby("Nome da Origem")
+                       if not df_origem.empty]
+
+    # No modo em blocos as origens só são conhecidas à medida que a planilha é lida: cada
+    # uma entra na fila, na ordem da planilha, quando é consumida pelo pool. Na fila fica
+    # [nome, chave, arquivos, divisor]: `arquivos` já vem preenchido quando a origem foi
+    # reaproveitada; `divisor` monta as partes da origem dividida, bloco a bloco.
+    fila = deque()
+
+    def tarefa(funcao, nome, *args):
+        return (funcao,) + args if perfil is None else (funcao, nome) + args
+
+    def montar_tarefas():
+        for nome_arquivo, df_origem in origens:
+            nome = nome_arquivo_saida(nome_arquivo)
+            chave = arquivos = None
+            if reaproveitar:
+                with perfilar(nome) as coletor, medir("cache", len(df_origem)):
+                    chave = assinatura_origem(df_origem)
+                    if dividir:
+                        chave = f"{chave}-g{max_guias or 0}-b{max_bytes or 0}"
+                    conteudo = None if forcar else ler_gerado(chave)
+                    if conteudo is not None:
+                        arquivos = _separar_partes(nome, conteudo) if dividir else [(nome, conteudo)]
+                if perfil is not None:
+                    perfil.extend(coletor.registros())
+            if arquivos is not None or not dividir:
+                fila.append([nome, chave, arquivos, None])
+                if arquivos is None:
+                    yield tarefa(gerar_arquivo_xte, nome, df_origem, carimbo)
+                continue
+
+            blocos = _blocos_de_guias(df_origem)
+            fila.append([nome, chave, None, DivisorLote(nome, df_origem.iloc[0], carimbo, len(blocos),
+                                                        max_guias, max_bytes)])
+            for posicoes in blocos:
+                yield tarefa(gerar_fragmento_guias, nome, df_origem.iloc[posicoes])
+
+    def reaproveitados_na_frente():
+        while fila and fila[0][2] is not None:
+            _, _, arquivos, _ = fila.popleft()
+            for nome, conteudo in arquivos:
+                if reaproveitados is not None:
+                    reaproveitados.append(nome)
+                yield nome, conteudo
+
+    # Sabendo a quantidade de tarefas, o pool não sobe mais processos que tarefas
+    tarefas = montar_tarefas() if em_blocos else list(montar_tarefas())
+    gerados = []
+    for resultado in iterar_em_paralelo(chamar if perfil is None else com_perfil, tarefas, max_workers=max_workers):
+        if perfil is not None:
+            resultado, registros = resultado
+            perfil.extend(registros)
+        yield from reaproveitados_na_frente()
+        nome, chave, _, divisor = fila[0]
+        if divisor is None:
+            prontos = [(nome, resultado)]
+        else:
+            with perfilar(nome) as coletor, medir("divisao"):
+                prontos = divisor.acrescentar(resultado)
+            if perfil is not None:
+                perfil.extend(coletor.registros())
+        yield from prontos
+
+        if reaproveitar:
+            gerados.extend(prontos)
+        if divisor is None or divisor.concluido:
+            fila.popleft()
+            if reaproveitar:
+                with perfilar(nome) as coletor, medir("cache"):
+                    gravar_gerado(chave, _juntar_partes(gerados) if dividir else gerados[0][1])
+                if perfil is not None:
+                    perfil.extend(coletor.registros())
+                gerados = []
+    yield from reaproveitados_na_frente()
+
+    if perfil is not None:
+        perfil.extend(planilha.registros())
+
+
+def gerar_xte_do_excel(excel_file, max_workers=1, ao_concluir=None, em_blocos=False, perfil=None, **opcoes):
+    arquivos_gerados = {}
+    for i, (nome_limpo, conteudo) in enumerate(iterar_xte_do_excel(excel_file, max_workers, em_blocos, perfil,
+                                                                   **opcoes)):
+        arquivos_gerados[f"{nome_limpo}.xml"] = conteudo
+        arquivos_gerados[f"{nome_limpo}.xte"] = conteudo
+        if ao_concluir:
+            ao_concluir(i, conteudo)
+    return arquivos_gerados
+
+
+# --- Saída direto em ZIP ---
+# Cada arquivo é gravado uma única vez, no ZIP `destino` (arquivo em disco ou temporário),
+# assim que é gerado; nada fica acumulado na memória. Devolve os nomes gravados.
+# `ao_concluir(indice, nome)` é chamado a cada arquivo (para barra de progresso).
+# Os argumentos de reaproveitamento (reaproveitar, forcar, reaproveitados) e de divisão
+# (max_guias, max_bytes) seguem para iterar_xte_do_excel.
+def gerar_xte_em_zip(excel_file, destino, extensao=".xml", max_workers=1, ao_concluir=None, em_blocos=False,
+                     perfil=None, **opcoes):
+    nomes = []
+    with zipfile.ZipFile(destino, "w") as zipf:
+        for i, (nome_limpo, conteudo) in enumerate(iterar_xte_do_excel(excel_file, max_workers, em_blocos, perfil,
+                                                                       **opcoes)):
+            nome = f"{nome_limpo}{extensao}"
+            with perfilar(nome_limpo) as coletor, medir("zip"):
+                zipf.writestr(nome, conteudo)
+            if perfil is not None:
+                perfil.extend(coletor.registros())
+            nomes.append(nome)
+            if ao_concluir:
+                ao_concluir(i, nome)
+    return nomes
+
+
+# O conteúdo do .xml e do .xte é o mesmo: o ZIP com a outra extensão é montado a partir do
+# ZIP já gravado, copiando arquivo a arquivo (em blocos) só com o nome trocado.
+def trocar_extensao_zip(origem, destino, extensao):
+    with zipfile.ZipFile(origem) as zip_origem, zipfile.ZipFile(destino, "w") as zip_destino:
+        for info in zip_origem.infolist():
+            nova = zipfile.ZipInfo(f"{os.path.splitext(info.filename)[0]}{extensao}", info.date_time)
+            nova.compress_type = info.compress_type
+            nova.file_size = info.file_size
+            with zip_origem.open(info) as entrada, zip_destino.open(nova, "w") as saida:
+                shutil.copyfileobj(entrada, saida)
+    return destino
@@ -0,0 +1,570 @@
+import hashlib
+import io
+import os
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from xml.parsers import expat
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from cache_xte import gravar_cache, hash_conteudo, ler_cache
+from esquema_tiss import CABECALHO, NS_TISS, PROCEDIMENTOS, caminhos, eh_grupo
+from paralelo import chamar, executar_em_paralelo, iterar_em_paralelo, workers_padrao
+from perfil import com_perfil, medir, perfilar
+
+
+ns = {'ans': NS_TISS}
+
+_TAG_CABECALHO = f'{{{NS_TISS}}}cabecalho'
+_TAG_GUIA = f'{{{NS_TISS}}}guiaMonitoramento'
+
+# Quantidade de linhas acumuladas antes de virar um bloco do DataFrame no modo streaming
+TAMANHO_BLOCO_STREAM = 50_000
+
+RENOMEAR_COLUNAS = {
+    'valorInformado': 'valorInformado_proc',
+    'valorPagoFornecedor': 'valorPagoFornecedor_proc',
+    'dataRegistroTransacao': 'dataRegistroTransacao_cabecalho',
+    'horaRegistroTransacao': 'horaRegistroTransacao_cabecalho',
+    'registroANS': 'registroANS_cabecalho',
+    'versaoPadrao': 'versaoPadrao_cabecalho'
+}
+
+colunas_finais = [
+    'Nome da Origem', 'tipoRegistro', 'versaoTISSPrestador', 'formaEnvio', 'tipoTransacao', 'numeroLote',
+    'competenciaLote', 'dataRegistroTransacao', 'dataRegistroTransacao_cabecalho', 'horaRegistroTransacao',
+    'horaRegistroTransacao_cabecalho', 'registroANS_cabecalho', 'versaoPadrao_cabecalho', 'CNES',
+    'identificadorExecutante', 'codigoCNPJ_CPF', 'municipioExecutante', 'registroANSOperadoraIntermediaria',
+    'tipoAtendimentoOperadoraIntermediaria', 'numeroCartaoNacionalSaude', 'registroANS_monitorado',
+    'cnpjOperadora', 'dataEmissao', 'numeroCarteira', 'tempoPlano', 'nomeBeneficiario', 'cpfBeneficiario',
+    'dataNascimento', 'sexo', 'Idade_na_Realização', 'codigoMunicipioBeneficiario', 'municipioResidencia',
+    'numeroContrato', 'numeroRegistroPlano', 'tipoPlano', 'codigoContratadoNaOperadora', 'cpfContratado',
+    'cnpjContratado', 'nomeContratado', 'tipoEventoAtencao', 'origemEventoAtencao',
+    'numeroGuia_prestador', 'numeroGuia_operadora', 'identificacaoReembolso',
+    'guiaSolicitacaoInternacao', 'numeroGuiaSPSADTPrincipal', 'senha', 'dataSolicitacao', 'dataAutorizacao',
+    'dataRealizacao', 'dataInicialFaturamento', 'dataFimPeriodo', 'dataProtocoloCobranca', 'dataPagamento',
+    'dataProcessamentoGuia', 'tipoConsulta', 'tipoAtendimento', 'cboExecutante', 'cboProfissional',
+    'indicacaoRecemNato', 'indicacaoAcidente', 'caraterAtendimento', 'tipoInternacao', 'regimeInternacao',
+    'regimeAtendimento', 'tipoFaturamento', 'diariasAcompanhante', 'diariasUTI', 'motivoSaida',
+    'declaracaoNascido', 'declaracaoObito', 'codigoTabela', 'grupoProcedimento', 'codigoProcedimento',
+    'descricaoProcedimento', 'quantidadeExecutada', 'quantidadeInformada', 'quantidadePaga', 'unidadeMedida',
+    'valorInformado', 'valorProcessado', 'valorLiberado', 'valorGlosa', 'valorPagoProc',
+    'valorPagoFornecedor', 'valorCoParticipacao', 'valorTotalInformado', 'valorTotalProcessado',
+    'valorTotalLiberado', 'valorTotalPagoProcedimentos', 'valorTotalDiarias', 'valorTotalTaxas',
+    'valorTotalMateriais', 'valorTotalOPME', 'valorTotalMedicamentos', 'valorTotalGlosa', 'valorGlosaGuia',
+    'valorPagoGuia', 'valorPagoFornecedores', 'valorTotalTabelaPropria', 'valorTotalCoParticipacao',
+    'formaRemuneracao', 'valorRemuneracao', 'diagnosticoCID', 'diagnosticosCID10'
+]
+
+# Tags que chegam até o DataFrame final; o resto é descartado já na leitura da guia
+_TAGS_UTEIS = {
+    tag for tag in set(colunas_finais) | set(RENOMEAR_COLUNAS)
+    if RENOMEAR_COLUNAS.get(tag, tag) in colunas_finais
+}
+
+# Campos e caminhos vêm do layout em esquema_tiss, o mesmo usado na geração
+CAMPOS_CABECALHO = [tag for tag, _ in caminhos(CABECALHO)]
+
+# registroANSOperadoraIntermediaria e tipoAtendimentoOperadoraIntermediaria sempre foram
+# procurados também dentro de cada procedimento (ficam vazios ali no 1.05.00)
+CAMINHOS_PROCEDIMENTO = caminhos(PROCEDIMENTOS) + [
+    ('registroANSOperadoraIntermediaria', 'ans:registroANSOperadoraIntermediaria'),
+    ('tipoAtendimentoOperadoraIntermediaria', 'ans:tipoAtendimentoOperadoraIntermediaria'),
+]
+
+
+def _ler_grupo(elem, no, destino):
+    for filho in no['filhos']:
+        if eh_grupo(filho):
+            sub_elem = elem.find(f"ans:{filho['tag']}", namespaces=ns)
+            if sub_elem is not None:
+                _ler_grupo(sub_elem, filho, destino)
+        else:
+            destino[filho['tag']] = elem.findtext(f"ans:{filho['tag']}", default='', namespaces=ns)
+
+
+def extrair_cabecalho(cabecalho):
+    # Coleta as informações do cabecalho uma vez
+    cabecalho_info = {}
+    if cabecalho is not None:
+        _ler_grupo(cabecalho, CABECALHO, cabecalho_info)
+    return cabecalho_info
+
+
+def linhas_da_guia(guia, cabecalho_info):
+    guia_data = {}
+    guia_data.update(cabecalho_info)
+
+    # Loop principal para ler todas as tags como texto (as datas são tratadas depois, por coluna)
+    for elem in guia.iter():
+        tag_full = elem.tag.split('}')[-1]
+        if tag_full in _TAGS_UTEIS:
+            guia_data[tag_full] = elem.text if elem.text else None
+
+    procedimentos = guia.findall(f".//ans:{PROCEDIMENTOS['tag']}", namespaces=ns)
+    if not procedimentos:
+        return [guia_data]
+
+    linhas = []
+    for proc in procedimentos:
+        proc_data = guia_data.copy()
+        # Extração específica dos procedimentos
+        for campo, caminho in CAMINHOS_PROCEDIMENTO:
+            proc_data[campo] = (proc.findtext(caminho, namespaces=ns) or '').strip()
+        linhas.append(proc_data)
+    return linhas
+
+
+# Datas das guias vêm do XML como AAAA-MM-DD e viram DD/MM/AAAA; o que não for data válida
+# fica como veio. As do cabecalho não passam por essa etapa.
+def _iso_para_br(texto):
+    try:
+        return datetime.strptime(texto, '%Y-%m-%d').strftime('%d/%m/%Y')
+    except ValueError:
+        return texto
+
+
+# Converte os valores distintos de uma coluna de data de uma vez. Quando o primeiro valor é
+# uma data ISO válida o pandas inferiria DD/MM/AAAA para a coluna inteira, então as datas ISO
+# são aproveitadas direto e só o que sobrar passa pelo caminho texto a texto.
+def _converter_datas(distintos, vem_da_guia):
+    if vem_da_guia and len(distintos):
+        eh_iso = distintos.str.fullmatch(r'\d{4}-\d{2}-\d{2}') == True
+        datas = pd.to_datetime(distintos.where(eh_iso), format='%Y-%m-%d', errors='coerce')
+        if pd.notna(datas.iloc[0]):
+            resto = datas.isna()
+            if resto.any():
+                datas[resto] = pd.to_datetime(distintos[resto].map(_iso_para_br), format='%d/%m/%Y', errors='coerce')
+            return datas
+        distintos = distintos.map(_iso_para_br)
+    return pd.to_datetime(distintos, dayfirst=True, errors='coerce')
+
+
+# Cada data distinta da coluna é convertida uma única vez e o resultado é espalhado para
+# as linhas pelos códigos do factorize. Devolve as datas (para a idade) e o texto final.
+def _normalizar_coluna_data(serie, vem_da_guia):
+    codigos, distintos = pd.factorize(serie)
+    distintos = pd.Series(distintos, dtype=object)
+
+    try:
+        datas = _converter_datas(distintos, vem_da_guia)
+        textos = datas.dt.strftime('%d/%m/%Y')
+    except Exception:
+        # Mantém o texto como estava, igual ao tratamento antigo
+        datas = None
+        textos = distintos.map(_iso_para_br) if vem_da_guia else distintos
+
+    # O código -1 (vazio) cai na última posição, que é NaN/NaT
+    textos = np.append(textos.to_numpy(dtype=object), np.nan)
+    texto_final = pd.Series(textos.take(codigos), index=serie.index, dtype=object)
+    if datas is None:
+        texto_final[codigos == -1] = serie[codigos == -1]
+        return None, texto_final
+    datas = np.append(datas.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT'))
+    return pd.Series(datas.take(codigos), index=serie.index), texto_final
+
+
+def montar_df(df, nome_origem):
+    with medir('dataframe', len(df)):
+        return _montar_df(df, nome_origem)
+
+
+def _montar_df(df, nome_origem):
+    # Recebe o DataFrame "cru" das linhas e aplica datas, idade e a ordem final das colunas
+    df['Nome da Origem'] = nome_origem
+
+    datas = {}
+    date_columns = [col for col in df.columns if 'data' in col.lower()]
+    with medir('datas', len(df) * len(date_columns)):
+        for col in date_columns:
+            datas[col], df[col] = _normalizar_coluna_data(df[col], col not in CAMPOS_CABECALHO)
+
+    # Calcular idade
+    if 'dataRealizacao' in df.columns and 'dataNascimento' in df.columns:
+        df['Idade_na_Realização'] = _calcular_idade(datas['dataRealizacao'], datas['dataNascimento'], df.index)
+
+    # --- Padronização e ordenação das colunas (sem alterações) ---
+    df.rename(columns=RENOMEAR_COLUNAS, inplace=True)
+
+    for col in colunas_finais:
+        if col not in df.columns:
+            df[col] = None
+
+    return df[colunas_finais]
+
+
+# Idade em anos completos (dias // 365), calculada para a coluna inteira de uma vez.
+# Mantém o tipo que o cálculo linha a linha produzia: int quando todas as linhas têm idade,
+# float com NaN quando só algumas têm e None quando nenhuma tem.
+def _calcular_idade(data_realizacao, data_nascimento, indice):
+    if data_realizacao is None or data_nascimento is None:
+        return pd.Series([None] * len(indice), index=indice, dtype=object)
+    idade = (data_realizacao - data_nascimento).dt.days // 365
+    if idade.isna().all():
+        return pd.Series([None] * len(indice), index=indice, dtype=object)
+    if idade.notna().all():
+        return idade.astype('int64')
+    return idade
+
+
+def parse_xte_arvore(root, nome_origem):
+    all_data = []
+    with medir('achatamento') as medida:
+        cabecalho_info = extrair_cabecalho(root.find('.//ans:cabecalho', namespaces=ns))
+        for guia in root.findall(".//ans:guiaMonitoramento", namespaces=ns):
+            all_data.extend(linhas_da_guia(guia, cabecalho_info))
+        medida['linhas'] = len(all_data)
+    with medir('dataframe'):
+        df = pd.DataFrame(all_data)
+    return montar_df(df, nome_origem)
+
+
+# --- Leitura em streaming (lotes grandes) ---
+# Lê os bytes aos poucos com iterparse, gera as linhas de cada guiaMonitoramento assim que
+# ela fecha e descarta o elemento em seguida: a árvore completa nunca fica em memória.
+def iterar_linhas_xte(fonte):
+    # O decode original é sempre ISO-8859-1, independente do que o arquivo declara
+    parser = ET.XMLParser(encoding='iso-8859-1')
+    pilha = []
+    cabecalho_info = None
+    for evento, elem in ET.iterparse(fonte, events=('start', 'end'), parser=parser):
+        if evento == 'start':
+            pilha.append(elem)
+            continue
+        pilha.pop()
+        if elem.tag == _TAG_CABECALHO and cabecalho_info is None:
+            cabecalho_info = extrair_cabecalho(elem)
+        elif elem.tag == _TAG_GUIA:
+            yield from linhas_da_guia(elem, cabecalho_info or {})
+            elem.clear()
+            if pilha:
+                pilha[-1].remove(elem)
+
+
+def parse_xte_stream(fonte, nome_origem=None, tamanho_bloco=TAMANHO_BLOCO_STREAM):
+    if nome_origem is None:
+        nome_origem = getattr(fonte, 'name', str(fonte))
+    if hasattr(fonte, 'seek'):
+        fonte.seek(0)
+
+    # As linhas viram DataFrames em blocos para não acumular milhões de dicts.
+    # Os blocos ficam como object e os tipos são inferidos só no final, como faria
+    # um único pd.DataFrame(all_data).
+    # No perfil, o parse e o achatamento das guias são uma etapa só (acontecem juntos).
+    blocos = []
+    linhas = []
+    with medir('parse_xml') as medida:
+        for linha in iterar_linhas_xte(fonte):
+            linhas.append(linha)
+            if len(linhas) >= tamanho_bloco:
+                with medir('dataframe'):
+                    blocos.append(pd.DataFrame(linhas, dtype=object))
+                linhas = []
+        medida['linhas'] = sum(map(len, blocos)) + len(linhas)
+    with medir('dataframe'):
+        if linhas or not blocos:
+            blocos.append(pd.DataFrame(linhas, dtype=object))
+        df = blocos[0] if len(blocos) == 1 else pd.concat(blocos, ignore_index=True)
+        df = df.infer_objects()
+    return montar_df(df, nome_origem)
+
+
+# --- Leitura de vários arquivos em paralelo ---
+def parse_xte_bytes(nome_origem, dados, streaming=False, usar_cache=False):
+    if usar_cache:
+        with medir('hash'):
+            chave = hash_conteudo(dados)
+        with medir('cache') as medida:
+            df = ler_cache(chave, nome_origem)
+            medida['linhas'] = None if df is None else len(df)
+        if df is not None:
+            return df
+
+    if streaming:
+        df = parse_xte_stream(io.BytesIO(dados), nome_origem)
+    else:
+        with medir('decodificacao'):
+            texto = dados.decode('iso-8859-1')
+        with medir('parse_xml'):
+            root = ET.fromstring(texto)
+        del texto
+        df = parse_xte_arvore(root, nome_origem)
+
+    if usar_cache:
+        with medir('cache'):
+            gravar_cache(chave, df)
+    return df
+
+
+# Lê o arquivo dentro do próprio worker, para não passar o conteúdo entre processos
+def parse_xte_arquivo(caminho, streaming=False, usar_cache=False):
+    with open(caminho, 'rb') as arquivo:
+        dados = arquivo.read()
+    return parse_xte_bytes(os.path.basename(caminho), dados, streaming=streaming, usar_cache=usar_cache)
+
+
+# `arquivos` é uma lista de (nome, bytes). Os DataFrames são concatenados na ordem da
+# lista, não na ordem em que os processos terminam, então o resultado é determinístico.
+# Com cache, os lotes já conhecidos são resolvidos aqui mesmo e só o resto vai para o pool.
+# `perfil` (lista) recebe os registros de tempo por etapa de cada arquivo (perfil.py).
+def parse_xte_paralelo(arquivos, max_workers=None, streaming=False, usar_cache=False, ao_concluir=None,
+                       perfil=None):
+    dfs = [None] * len(arquivos)
+    pendentes = []
+    for i, (nome, dados) in enumerate(arquivos):
+        if usar_cache:
+            with perfilar(nome) as coletor:
+                with medir('hash'):
+                    chave = hash_conteudo(dados)
+                with medir('cache'):
+                    dfs[i] = ler_cache(chave, nome)
+        if dfs[i] is None:
+            pendentes.append(i)
+            continue
+        if perfil is not None:
+            perfil.extend(coletor.registros())
+        if ao_concluir:
+            ao_concluir(i, dfs[i])
+
+    def resultado(lido):
+        if perfil is None:
+            return lido
+        df, registros = lido
+        perfil.extend(registros)
+        return df
+
+    def concluido(j, lido):
+        if ao_concluir:
+            ao_concluir(pendentes[j], lido if perfil is None else lido[0])
+
+    tarefas = [(arquivos[i][0], arquivos[i][1], streaming, usar_cache) for i in pendentes]
+    funcao = parse_xte_bytes
+    if perfil is not None:
+        tarefas = [(parse_xte_bytes, args[0]) + args for args in tarefas]
+        funcao = com_perfil
+    lidos = executar_em_paralelo(funcao, tarefas, max_workers=max_workers, ao_concluir=concluido)
+    for i, lido in zip(pendentes, lidos):
+        dfs[i] = resultado(lido)
+    return pd.concat(dfs, ignore_index=True)
+
+
+# --- Lotes dentro de arquivos ZIP ---
+# Os .xte são lidos direto do ZIP (caminho ou arquivo aberto/enviado), sem extrair para o
+# disco; o nome do membro no ZIP vira 'Nome da Origem'. Pastas e outros arquivos são ignorados.
+def membros_xte_zip(zip_file):
+    with zipfile.ZipFile(zip_file) as zipf:
+        return [info.filename for info in zipf.infolist()
+                if not info.is_dir() and info.filename.lower().endswith('.xte')
+                and not info.filename.startswith('__MACOSX/')]
+
+
+# (nome, bytes) de cada .xte do ZIP, descompactado só quando é pedido
+def ler_membros_zip(zip_file):
+    with zipfile.ZipFile(zip_file) as zipf:
+        for membro in membros_xte_zip(zip_file):
+            yield membro, zipf.read(membro)
+
+
+def _parse_membro(zipf, membro, streaming=False, usar_cache=False):
+    # Sem cache (que precisa do hash do conteúdo inteiro), o streaming lê do membro enquanto descompacta
+    if streaming and not usar_cache:
+        with zipf.open(membro) as fonte:
+            return parse_xte_stream(fonte, membro)
+    with medir('zip'):
+        dados = zipf.read(membro)
+    return parse_xte_bytes(membro, dados, streaming=streaming, usar_cache=usar_cache)
+
+
+# Worker com o ZIP em disco: abre o ZIP ele mesmo, sem receber o conteúdo do processo principal
+def _parse_membro_zip(caminho_zip, membro, streaming=False, usar_cache=False):
+    with zipfile.ZipFile(caminho_zip) as zipf:
+        return _parse_membro(zipf, membro, streaming, usar_cache)
+
+
+# Lê todos os .xte de um ZIP, vários ao mesmo tempo, e devolve o DataFrame concatenado na
+# ordem dos membros. ZIP enviado (sem caminho): cada membro é descompactado quando entra no
+# pool, então só alguns ficam na memória de cada vez. Mesmos argumentos de parse_xte_paralelo.
+def parse_xte_zip(zip_file, max_workers=None, streaming=False, usar_cache=False, ao_concluir=None, perfil=None):
+    membros = membros_xte_zip(zip_file)
+    if not membros:
+        raise ValueError(f"Nenhum arquivo .xte dentro do ZIP '{getattr(zip_file, 'name', zip_file)}'.")
+    max_workers = min(max_workers or workers_padrao(), len(membros))
+    caminho = zip_file if isinstance(zip_file, (str, os.PathLike)) else None
+
+    dfs = []
+    with zipfile.ZipFile(zip_file) as zipf:
+        def tarefas():
+            for membro in membros:
+                if max_workers <= 1:
+                    args = (_parse_membro, zipf, membro, streaming, usar_cache)
+                elif caminho is not None:
+                    args = (_parse_membro_zip, caminho, membro, streaming, usar_cache)
+                else:
+                    with perfilar(membro) as coletor, medir('zip'):
+                        dados = zipf.read(membro)
+                    if perfil is not None:
+                        perfil.extend(coletor.registros())
+                    args = (parse_xte_bytes, membro, dados, streaming, usar_cache)
+                yield args if perfil is None else (args[0], membro) + args[1:]
+
+        for i, lido in enumerate(iterar_em_paralelo(chamar if perfil is None else com_perfil, tarefas(),
+                                                    max_workers=max_workers)):
+            if perfil is not None:
+                lido, registros = lido
+                perfil.extend(registros)
+            dfs.append(lido)
+            if ao_concluir:
+                ao_concluir(i, lido)
+    return pd.concat(dfs, ignore_index=True)
+
+
+# --- Conferência do hash do epílogo ---
+# Recalcula o MD5 do mesmo jeito que o epílogo é gerado: o texto (sem espaços nas pontas) de
+# tudo o que está dentro do cabecalho e da Mensagem, na ordem do arquivo.
+_BLOCOS_HASH = {'cabecalho', 'Mensagem'}
+
+_INICIO_CABECALHO = re.compile(rb'<(?:[\w.-]+:)?cabecalho[\s>]')
+_INICIO_EPILOGO = re.compile(rb'<(?:[\w.-]+:)?epilogo[\s>/]')
+_HASH_EPILOGO = re.compile(rb'<(?:[\w.-]+:)?hash>([^<]*)<')
+# Trechos de texto entre tags, já sem os espaços das pontas (mesmos caracteres que o
+# str.strip() remove em ISO-8859-1). Trechos só de espaço/indentação não entram.
+_ESPACO = rb'[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0]'
+_TEXTO_ENTRE_TAGS = re.compile(rb'>' + _ESPACO + rb'*([^<\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0][^<]*?)' + _ESPACO + rb'*<')
+_ENTIDADE = re.compile(r'&(#x[0-9a-fA-F]+|#[0-9]+|amp|lt|gt|quot|apos);')
+_ENTIDADES_XML = {'amp': '&', 'lt': '<', 'gt': '>', 'quot': '"', 'apos': "'"}
+
+
+def _desfazer_entidade(m):
+    nome = m.group(1)
+    if nome.startswith('#x'):
+        return chr(int(nome[2:], 16))
+    if nome.startswith('#'):
+        return chr(int(nome[1:]))
+    return _ENTIDADES_XML[nome]
+
+
+def _desfazer_entidades(trecho):
+    texto = _ENTIDADE.sub(_desfazer_entidade, trecho.decode('iso-8859-1')).strip()
+    return texto.encode('iso-8859-1')
+
+
+# Caminho rápido: regex direto nos bytes, sem parser. Só vale para o formato simples que o
+# TISS usa (sem comentários, CDATA ou instruções no meio); do contrário devolve None.
+def _hash_por_regex(dados):
+    inicio = _INICIO_CABECALHO.search(dados)
+    fim = _INICIO_EPILOGO.search(dados, inicio.end() if inicio else 0)
+    if inicio is None or fim is None:
+        return None
+    regiao = dados[inicio.start():fim.start() + 1]
+    if b'<!' in regiao or b'<?' in regiao:
+        return None
+    hash_informado = _HASH_EPILOGO.search(dados, fim.start())
+
+    trechos = _TEXTO_ENTRE_TAGS.findall(regiao.replace(b'\r\n', b'\n').replace(b'\r', b'\n'))
+    if b'&' in regiao:
+        trechos = [_desfazer_entidades(trecho) if b'&' in trecho else trecho for trecho in trechos]
+    md5 = hashlib.md5(b''.join(trechos))
+    informado = hash_informado.group(1).decode('iso-8859-1').strip() if hash_informado else ''
+    return informado, md5.hexdigest()
+
+
+# Caminho geral: expat direto, sem montar elementos
+def _hash_por_expat(fonte):
+    md5 = hashlib.md5()
+    estado = {'nivel_bloco': 0, 'no_epilogo': False, 'lendo_hash': False}
+    textos = []
+    hash_informado = []
+
+    def descarregar():
+        if estado['nivel_bloco'] and textos:
+            texto = ''.join(textos).strip()
+            if texto:
+                md5.update(texto.encode('iso-8859-1'))
+        textos.clear()
+
+    def inicio(nome, _atributos):
+        local = nome.rsplit(' ', 1)[-1]
+        descarregar()
+        if estado['nivel_bloco']:
+            estado['nivel_bloco'] += 1
+        elif local in _BLOCOS_HASH:
+            estado['nivel_bloco'] = 1
+        elif local == 'epilogo':
+            estado['no_epilogo'] = True
+        elif local == 'hash' and estado['no_epilogo']:
+            estado['lendo_hash'] = True
+
+    def fim(nome):
+        descarregar()
+        if estado['nivel_bloco']:
+            estado['nivel_bloco'] -= 1
+        estado['lendo_hash'] = False
+
+    def dados(texto):
+        if estado['nivel_bloco']:
+            textos.append(texto)
+        elif estado['lendo_hash']:
+            hash_informado.append(texto)
+
+    # Mesmo decode da leitura: ISO-8859-1, independente do que o arquivo declara
+    parser = expat.ParserCreate(encoding='iso-8859-1', namespace_separator=' ')
+    parser.buffer_text = True
+    parser.StartElementHandler = inicio
+    parser.EndElementHandler = fim
+    parser.CharacterDataHandler = dados
+    if isinstance(fonte, bytes):
+        parser.Parse(fonte, True)
+    else:
+        parser.ParseFile(fonte)
+    return ''.join(hash_informado).strip(), md5.hexdigest()
+
+
+def verificar_hash_xte(fonte):
+    if not isinstance(fonte, bytes):
+        if hasattr(fonte, 'seek'):
+            fonte.seek(0)
+        fonte = fonte.read()
+    try:
+        resultado = _hash_por_regex(fonte)
+    except (ValueError, UnicodeError):
+        resultado = None
+    if resultado is None:
+        resultado = _hash_por_expat(fonte)
+
+    informado, calculado = resultado
+    return {'hash_informado': informado, 'hash_calculado': calculado,
+            'hash_confere': informado.lower() == calculado}
+
+
+def _verificar_hash_bytes(nome_origem, dados):
+    try:
+        with medir('hash'):
+            resultado = verificar_hash_xte(dados)
+    except expat.ExpatError as erro:
+        resultado = {'hash_informado': '', 'hash_calculado': f'XML inválido: {erro}', 'hash_confere': False}
+    return {'Nome da Origem': nome_origem, **resultado}
+
+
+# Confere vários arquivos ((nome, bytes) de uma lista ou gerador, como ler_membros_zip);
+# devolve uma linha por arquivo. Do gerador, só alguns conteúdos ficam na memória por vez.
+def verificar_hashes(arquivos, max_workers=None, ao_concluir=None, perfil=None):
+    if hasattr(arquivos, '__len__'):
+        max_workers = min(max_workers or workers_padrao(), max(len(arquivos), 1))
+    tarefas = arquivos
+    funcao = _verificar_hash_bytes
+    if perfil is not None:
+        tarefas = ((_verificar_hash_bytes, nome, nome, dados) for nome, dados in arquivos)
+        funcao = com_perfil
+
+    resultados = []
+    for i, resultado in enumerate(iterar_em_paralelo(funcao, tarefas, max_workers=max_workers)):
+        if perfil is not None:
+            resultado, registros = resultado
+            perfil.extend(registros)
+        resultados.append(resultado)
+        if ao_concluir:
+            ao_concluir(i, resultado)
+    return pd.DataFrame(resultados, columns=['Nome da Origem', 'hash_informado', 'hash_calculado', 'hash_confere'])
@@ -0,0 +1,174 @@
+import argparse
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from geracao_xte import carimbo_transacao, gerar_arquivo_xte
+from validacao_xte import PESOS_CNPJ, PESOS_CPF, dv_modulo_11
+
+
+# --- Lotes sintéticos de Monitoramento TISS 1.05.00 ---
+# Monta uma planilha no mesmo formato da exportação (uma linha por procedimento, datas em
+# DD/MM/AAAA) com valores aleatórios mas coerentes: CPF/CNPJ/CNS com dígitos verificadores
+# válidos, números de guia únicos e totais da guia iguais à soma dos procedimentos.
+# O .xte sai do próprio gerador (gerar_arquivo_xte), então o layout e o hash são os reais.
+# Serve para benchmarks e para testar volumes grandes sem dados de beneficiários.
+def _digitos(rng, n, quantidade, primeiro=None):
+    digitos = rng.integers(0, 10, size=(n, quantidade))
+    if primeiro is not None:
+        digitos[:, 0] = primeiro
+    return digitos
+
+
+def _juntar(digitos):
+    return pd.Series(digitos.astype(str).tolist()).str.join('').to_numpy(dtype=object)
+
+
+def _cpfs(rng, n):
+    digitos = _digitos(rng, n, 9)
+    for pesos in PESOS_CPF:
+        digitos = np.column_stack([digitos, dv_modulo_11(digitos, pesos)])
+    return _juntar(digitos)
+
+
+def _cnpjs(rng, n):
+    digitos = _digitos(rng, n, 12)
+    for pesos in PESOS_CNPJ:
+        digitos = np.column_stack([digitos, dv_modulo_11(digitos, pesos)])
+    return _juntar(digitos)
+
+
+# CNS provisório (começa com 7): a soma ponderada (pesos 15..1) tem que ser múltipla de 11.
+# Os dois últimos dígitos (pesos 2 e 1) completam o que falta.
+def _cnss(rng, n):
+    digitos = _digitos(rng, n, 13, primeiro=7)
+    falta = -(digitos * np.arange(15, 2, -1)).sum(axis=1) % 11
+    penultimo = np.where(falta == 10, 5, 0)
+    ultimo = np.where(falta == 10, 0, falta)
+    return _juntar(np.column_stack([digitos, penultimo, ultimo]))
+
+
+def _datas(rng, n, inicio, fim):
+    dias = rng.integers(0, (fim - inicio).days + 1, size=n)
+    datas = pd.Timestamp(inicio) + pd.to_timedelta(dias, unit='D')
+    return datas.strftime('%d/%m/%Y').to_numpy(dtype=object)
+
+
+def _valores(centavos):
+    return pd.Series(centavos / 100).map('{:.2f}'.format).to_numpy(dtype=object)
+
+
+def gerar_planilha_sintetica(guias=1000, procedimentos=(1, 3), origens=1, prob_formas_remuneracao=0.5,
+                             prob_diagnostico=0.5, competencia='202301', semente=0):
+    rng = np.random.default_rng(semente)
+    minimo, maximo = procedimentos
+    procs_por_guia = rng.integers(minimo, maximo + 1, size=guias)
+    # Guia sem procedimento ainda ocupa uma linha (com os campos do procedimento vazios)
+    linhas_por_guia = np.maximum(procs_por_guia, 1)
+    guia = np.repeat(np.arange(guias), linhas_por_guia)
+    n = len(guia)
+    tem_procedimento = np.repeat(procs_por_guia > 0, linhas_por_guia)
+
+    def por_guia(valores):
+        return np.asarray(valores, dtype=object)[guia]
+
+    def so_procedimento(valores):
+        return np.where(tem_procedimento, valores, None)
+
+    valor_informado = rng.integers(100, 500_000, size=n) * tem_procedimento
+    valor_pago = (valor_informado * rng.uniform(0.5, 1.0, size=n)).astype(np.int64)
+    total_informado = np.bincount(guia, weights=valor_informado, minlength=guias).astype(np.int64)
+    total_pago = np.bincount(guia, weights=valor_pago, minlength=guias).astype(np.int64)
+
+    formas = rng.random(guias) < prob_formas_remuneracao
+    diagnostico = rng.random(guias) < prob_diagnostico
+    realizacao = _datas(rng, guias, date(2022, 1, 1), date(2022, 12, 31))
+    numero_guia = np.char.zfill(np.arange(1, guias + 1).astype(str), 12)
+
+    colunas = {
+        # Origens em sequência, como na exportação XTE -> Excel (e como a leitura em blocos exige)
+        'Nome da Origem': por_guia([f'lote_{i * origens // guias + 1:04d}.xte' for i in range(guias)]),
+        'competenciaLote': competencia,
+        'registroANS_cabecalho': '123456',
+        'versaoPadrao_cabecalho': '1.05.00',
+        'tipoRegistro': '1',
+        'versaoTISSPrestador': '4.01.00',
+        'formaEnvio': '1',
+        'CNES': por_guia(_juntar(_digitos(rng, guias, 7))),
+        'identificadorExecutante': '1',
+        'codigoCNPJ_CPF': por_guia(_cnpjs(rng, guias)),
+        'municipioExecutante': '355030',
+        'numeroCartaoNacionalSaude': por_guia(_cnss(rng, guias)),
+        'cpfBeneficiario': por_guia(_cpfs(rng, guias)),
+        'sexo': por_guia(rng.choice(['1', '3'], size=guias)),
+        'dataNascimento': por_guia(_datas(rng, guias, date(1940, 1, 1), date(2021, 12, 31))),
+        'municipioResidencia': '355030',
+        'numeroRegistroPlano': por_guia(_juntar(_digitos(rng, guias, 9, primeiro=4))),
+        'tipoEventoAtencao': por_guia(rng.choice(['1', '2', '3', '4', '5'], size=guias)),
+        'origemEventoAtencao': por_guia(rng.choice(['1', '2', '3', '4', '5'], size=guias)),
+        'numeroGuia_prestador': por_guia(numero_guia),
+        'numeroGuia_operadora': por_guia(numero_guia),
+        'identificacaoReembolso': '00000000000000000000',
+        'formaRemuneracao': por_guia(np.where(formas, '1', None)),
+        'valorRemuneracao': por_guia(np.where(formas, _valores(total_pago), None)),
+        'dataRealizacao': por_guia(realizacao),
+        'dataProtocoloCobranca': por_guia(realizacao),
+        'dataPagamento': por_guia(realizacao),
+        'dataProcessamentoGuia': por_guia(realizacao),
+        'caraterAtendimento': '1',
+        'diagnosticoCID': por_guia(np.where(diagnostico, rng.choice(['A09', 'J06', 'R51', 'Z00'], size=guias), None)),
+        'tipoAtendimento': '05',
+        'regimeAtendimento': '01',
+        'valorTotalInformado': por_guia(_valores(total_informado)),
+        'valorProcessado': por_guia(_valores(total_informado)),
+        'valorTotalPagoProcedimentos': por_guia(_valores(total_pago)),
+        'valorPagoGuia': por_guia(_valores(total_pago)),
+        'valorPagoFornecedores': '0.00',
+        'valorTotalCoParticipacao': '0.00',
+        'codigoTabela': so_procedimento('22'),
+        'codigoProcedimento': so_procedimento(_juntar(_digitos(rng, n, 8, primeiro=1))),
+        'quantidadeInformada': so_procedimento(rng.integers(1, 6, size=n).astype(str)),
+        'valorInformado': so_procedimento(_valores(valor_informado)),
+        'quantidadePaga': so_procedimento(rng.integers(1, 6, size=n).astype(str)),
+        'valorPagoProc': so_procedimento(_valores(valor_pago)),
+        'valorPagoFornecedor': so_procedimento('0.00'),
+    }
+    df = pd.DataFrame({col: np.broadcast_to(np.asarray(valores, dtype=object), n) for col, valores in colunas.items()})
+    # Células vazias como NaN, como na leitura da planilha com dtype=str
+    return df.where(df.notna(), np.nan)
+
+
+def gerar_lote_sintetico(guias=1000, procedimentos=(1, 3), **opcoes):
+    df = gerar_planilha_sintetica(guias, procedimentos, origens=1, **opcoes)
+    return gerar_arquivo_xte(df, carimbo_transacao())
+
+
+def _intervalo(texto):
+    minimo, _, maximo = texto.partition('-')
+    return int(minimo), int(maximo or minimo)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gera um lote .xte (ou planilha) sintético de Monitoramento TISS.")
+    parser.add_argument('saida', help="Arquivo de saída: .xte/.xml gera o lote, .csv/.xlsx gera a planilha.")
+    parser.add_argument('-g', '--guias', type=int, default=1000)
+    parser.add_argument('-p', '--procedimentos', type=_intervalo, default=(1, 3),
+                        help="Procedimentos por guia: N ou MIN-MAX (padrão 1-3).")
+    parser.add_argument('-o', '--origens', type=int, default=1, help="Quantidade de 'Nome da Origem' na planilha.")
+    parser.add_argument('--formas-remuneracao', type=float, default=0.5, help="Proporção de guias com formasRemuneracao.")
+    parser.add_argument('--diagnostico', type=float, default=0.5, help="Proporção de guias com diagnosticosCID10.")
+    parser.add_argument('--semente', type=int, default=0)
+    args = parser.parse_args()
+
+    opcoes = dict(prob_formas_remuneracao=args.formas_remuneracao, prob_diagnostico=args.diagnostico,
+                  semente=args.semente)
+    if args.saida.lower().endswith(('.xte', '.xml')):
+        with open(args.saida, 'wb') as arquivo:
+            arquivo.write(gerar_lote_sintetico(args.guias, args.procedimentos, **opcoes))
+    else:
+        df = gerar_planilha_sintetica(args.guias, args.procedimentos, args.origens, **opcoes)
+        if args.saida.lower().endswith('.csv'):
+            df.to_csv(args.saida, index=False, sep=';')
+        else:
+            df.to_excel(args.saida, index=False)
@@ -1,145 +1,44 @@
 import streamlit as st
 import pandas as pd
 import xml.etree.ElementTree as ET
-import hashlib
 import io
-from datetime import datetime
-import re
+import itertools
 from collections import defaultdict
-import xml.dom.minidom as minidom
-import os
 import zipfile
+import tempfile
 import time
-from datetime import datetime
-import pytz # Importar pytz
+from geracao_xte import gerar_xte_em_zip, ler_planilha, trocar_extensao_zip
+from leitura_xte import (
+    ler_membros_zip, membros_xte_zip, parse_xte_arvore, parse_xte_bytes, parse_xte_paralelo, parse_xte_stream,
+    parse_xte_zip, verificar_hashes,
+)
+from paralelo import workers_padrao
+from perfil import medir, perfil_json, perfilar, resumo_por_etapa, rotular_etapas, tabela_perfil
+from tipagem_xte import tipar_df
+from trabalhos import ArmazemTrabalhos, chave_trabalho
+from duplicatas_xte import detectar_duplicatas, remover_duplicatas
+from banco_xte import (
+    CAMINHO_BANCO, COLUNAS_CONSULTA, consultar_registros, gravar_no_banco, lotes_no_banco, totais_por_competencia,
+)
+from exportacao import LIMITE_LINHAS_EXCEL, exportar_csv, exportar_excel, exportar_excel_em_arquivos, exportar_parquet
+from validacao_xte import resumo_validacao, validar_em_blocos, validar_planilha
 
 
 
 @st.cache_data
 def parse_xte(file):
     file.seek(0)
-    content = file.read().decode('iso-8859-1')
-    tree = ET.ElementTree(ET.fromstring(content))
-    root = tree.getroot()
-    ns = {'ans': 'http://www.ans.gov.br/padroes/tiss/schemas'}
-    all_data = []
+    with medir('decodificacao'):
+        content = file.read().decode('iso-8859-1')
+    with medir('parse_xml'):
+        tree = ET.ElementTree(ET.fromstring(content))
+    df = parse_xte_arvore(tree.getroot(), file.name)
+    return df, content, tree
     
-    # Coleta as informações do cabecalho uma vez
-    cabecalho_info = {}
-    cabecalho = root.find('.//ans:cabecalho', namespaces=ns)
-    if cabecalho is not None:
-        identificacao = cabecalho.find('ans:identificacaoTransacao', namespaces=ns)
-        if identificacao is not None:
-            cabecalho_info['tipoTransacao'] = identificacao.findtext('ans:tipoTransacao', default='', namespaces=ns)
-            cabecalho_info['numeroLote'] = identificacao.findtext('ans:numeroLote', default='', namespaces=ns)
-            cabecalho_info['competenciaLote'] = identificacao.findtext('ans:competenciaLote', default='', namespaces=ns)
-            cabecalho_info['dataRegistroTransacao'] = identificacao.findtext('ans:dataRegistroTransacao', default='', namespaces=ns)
-            cabecalho_info['horaRegistroTransacao'] = identificacao.findtext('ans:horaRegistroTransacao', default='', namespaces=ns)
-        cabecalho_info['registroANS'] = cabecalho.findtext('ans:registroANS', default='', namespaces=ns)
-        cabecalho_info['versaoPadrao'] = cabecalho.findtext('ans:versaoPadrao', default='', namespaces=ns)
-
-    for guia in root.findall(".//ans:guiaMonitoramento", namespaces=ns):
-        guia_data = {}
-        guia_data.update(cabecalho_info)
-
-        # Loop principal para ler todas as tags como texto
-        for elem in guia.iter():
-            tag_full = elem.tag.split('}')[-1]
-            if 'data' in tag_full.lower() and elem.text:
-                try:
-                    date_obj = datetime.strptime(elem.text, '%Y-%m-%d')
-                    guia_data[tag_full] = date_obj.strftime('%d/%m/%Y')
-                except ValueError:
-                    guia_data[tag_full] = elem.text
-            else:
-                guia_data[tag_full] = elem.text if elem.text else None
-
-        procedimentos = guia.findall(".//ans:procedimentos", namespaces=ns)
-        if procedimentos:
-            for proc in procedimentos:
-                proc_data = guia_data.copy()
-                # Extração específica dos procedimentos
-                proc_data['codigoProcedimento'] = (proc.findtext('ans:identProcedimento/ans:Procedimento/ans:codigoProcedimento', namespaces=ns) or '').strip()
-                proc_data['grupoProcedimento'] = (proc.findtext('ans:identProcedimento/ans:Procedimento/ans:grupoProcedimento', namespaces=ns) or '').strip()
-                proc_data['valorInformado'] = (proc.findtext('ans:valorInformado', namespaces=ns) or '').strip()
-                proc_data['valorPagoProc'] = (proc.findtext('ans:valorPagoProc', namespaces=ns) or '').strip()
-                campos_procedimento = ['quantidadeInformada', 'quantidadePaga', 'valorPagoFornecedor', 'valorCoParticipacao', 'unidadeMedida']
-                for campo in campos_procedimento:
-                    proc_data[campo] = (proc.findtext(f'ans:{campo}', namespaces=ns) or '').strip()
-                proc_data['codigoTabela'] = (proc.findtext('ans:identProcedimento/ans:codigoTabela', namespaces=ns) or '').strip()
-                proc_data['registroANSOperadoraIntermediaria'] = (proc.findtext('ans:registroANSOperadoraIntermediaria', namespaces=ns) or '').strip()
-                proc_data['tipoAtendimentoOperadoraIntermediaria'] = (proc.findtext('ans:tipoAtendimentoOperadoraIntermediaria', namespaces=ns) or '').strip()
-                all_data.append(proc_data)
-        else:
-            all_data.append(guia_data)
 
-    df = pd.DataFrame(all_data)
-    df['Nome da Origem'] = file.name
-
-    date_columns = [col for col in df.columns if 'data' in col.lower()]
-    for col in date_columns:
-        try:
-            df[col] = pd.to_datetime(df[col], dayfirst=True, errors='coerce').dt.strftime('%d/%m/%Y')
-        except Exception:
-            pass
-
-    # Calcular idade
-    if 'dataRealizacao' in df.columns and 'dataNascimento' in df.columns:
-        def calcular_idade(row):
-            try:
-                data_realizacao = datetime.strptime(row['dataRealizacao'], '%d/%m/%Y')
-                data_nascimento = datetime.strptime(row['dataNascimento'], '%d/%m/%Y')
-                return (data_realizacao - data_nascimento).days // 365
-            except Exception:
-                return None
-        df['Idade_na_Realização'] = df.apply(calcular_idade, axis=1)
-
-    # --- BLOCO DE REMOÇÃO DE ZEROS À ESQUERDA FOI REMOVIDO DAQUI ---
-
-    # --- Padronização e ordenação das colunas (sem alterações) ---
-    df.rename(columns={
-        'valorInformado': 'valorInformado_proc',
-        'valorPagoFornecedor': 'valorPagoFornecedor_proc',
-        'dataRegistroTransacao': 'dataRegistroTransacao_cabecalho',
-        'horaRegistroTransacao': 'horaRegistroTransacao_cabecalho',
-        'registroANS': 'registroANS_cabecalho',
-        'versaoPadrao': 'versaoPadrao_cabecalho'
-    }, inplace=True)
-
-    colunas_finais = [
-        'Nome da Origem', 'tipoRegistro', 'versaoTISSPrestador', 'formaEnvio', 'tipoTransacao', 'numeroLote', 
-        'competenciaLote', 'dataRegistroTransacao', 'dataRegistroTransacao_cabecalho', 'horaRegistroTransacao', 
-        'horaRegistroTransacao_cabecalho', 'registroANS_cabecalho', 'versaoPadrao_cabecalho', 'CNES', 
-        'identificadorExecutante', 'codigoCNPJ_CPF', 'municipioExecutante', 'registroANSOperadoraIntermediaria',
-        'tipoAtendimentoOperadoraIntermediaria', 'numeroCartaoNacionalSaude', 'registroANS_monitorado', 
-        'cnpjOperadora', 'dataEmissao', 'numeroCarteira', 'tempoPlano', 'nomeBeneficiario', 'cpfBeneficiario',
-        'dataNascimento', 'sexo', 'Idade_na_Realização', 'codigoMunicipioBeneficiario', 'municipioResidencia',
-        'numeroContrato', 'numeroRegistroPlano', 'tipoPlano', 'codigoContratadoNaOperadora', 'cpfContratado', 
-        'cnpjContratado', 'nomeContratado', 'tipoEventoAtencao', 'origemEventoAtencao', 
-        'numeroGuia_prestador', 'numeroGuia_operadora', 'identificacaoReembolso',
-        'guiaSolicitacaoInternacao', 'numeroGuiaSPSADTPrincipal', 'senha', 'dataSolicitacao', 'dataAutorizacao',
-        'dataRealizacao', 'dataInicialFaturamento', 'dataFimPeriodo', 'dataProtocoloCobranca', 'dataPagamento',
-        'dataProcessamentoGuia', 'tipoConsulta', 'tipoAtendimento', 'cboExecutante', 'cboProfissional',
-        'indicacaoRecemNato', 'indicacaoAcidente', 'caraterAtendimento', 'tipoInternacao', 'regimeInternacao', 
-        'regimeAtendimento', 'tipoFaturamento', 'diariasAcompanhante', 'diariasUTI', 'motivoSaida', 
-        'declaracaoNascido', 'declaracaoObito', 'codigoTabela', 'grupoProcedimento', 'codigoProcedimento', 
-        'descricaoProcedimento', 'quantidadeExecutada', 'quantidadeInformada', 'quantidadePaga', 'unidadeMedida', 
-        'valorInformado', 'valorProcessado', 'valorLiberado', 'valorGlosa', 'valorPagoProc', 
-        'valorPagoFornecedor', 'valorCoParticipacao', 'valorTotalInformado', 'valorTotalProcessado', 
-        'valorTotalLiberado', 'valorTotalPagoProcedimentos', 'valorTotalDiarias', 'valorTotalTaxas', 
-        'valorTotalMateriais', 'valorTotalOPME', 'valorTotalMedicamentos', 'valorTotalGlosa', 'valorGlosaGuia', 
-        'valorPagoGuia', 'valorPagoFornecedores', 'valorTotalTabelaPropria', 'valorTotalCoParticipacao', 
-        'formaRemuneracao', 'valorRemuneracao', 'diagnosticoCID', 'diagnosticosCID10'
-    ]
-
-    for col in colunas_finais:
-        if col not in df.columns:
-            df[col] = None
-    
-    df = df[colunas_finais]
+# ZIPs e planilhas gerados ficam na memória até esse tamanho; acima disso vão para um temporário em disco
+TAMANHO_MAXIMO_ZIP_MEMORIA = 64 * 1024 * 1024
 
-    return df, content, tree
-    
 
 def remove_duplicate_columns(df):
     df = df.loc[:, ~df.columns.duplicated()]
@@ -147,231 +46,116 @@ def remove_duplicate_columns(df):
     return df
 
 
-def gerar_xte_do_excel(excel_file):
-    print("--- DEBUG: Gerando XTE com lote por Minuto e Segundo (versão completa) ---")
-    ns = "http://www.ans.gov.br/padroes/tiss/schemas"
-
-    # --- Setup de Data/Hora e Leitura do Arquivo ---
-    fuso_horario_servidor = pytz.utc
-    fuso_horario_desejado = pytz.timezone("America/Sao_Paulo")
-    agora_no_fuso_desejado = datetime.now(fuso_horario_servidor).astimezone(fuso_horario_desejado)
-    data_atual = agora_no_fuso_desejado.strftime("%Y-%m-%d")
-    hora_atual = agora_no_fuso_desejado.strftime("%H:%M:%S")
-
-    # AJUSTE FINAL: Trocando Hora (%H) por Minuto (%M) na composição do lote.
-    minuto_e_segundos_atuais = agora_no_fuso_desejado.strftime("%M%S")
+# Tabela de tempo por etapa (perfil.py) e o JSON com os registros. O JSON é montado só no
+# clique, então inclui também as exportações baixadas depois que a tabela foi exibida.
+def mostrar_perfil(perfil, nome_json):
+    with st.expander("⏱ Tempo por etapa", expanded=True):
+        st.dataframe(rotular_etapas(resumo_por_etapa(perfil)), hide_index=True)
+        st.caption("Por arquivo:")
+        st.dataframe(rotular_etapas(tabela_perfil(perfil)), hide_index=True)
+        st.download_button("⬇ Baixar perfil (JSON)", data=lambda: perfil_json(perfil), file_name=nome_json,
+                           mime="application/json", on_click="ignore")
+
+
+# Botões de download de um relatório em Excel e CSV, montados só no clique
+def baixar_relatorio(relatorio, rotulo, nome_base):
+    def montar_relatorio(exportar):
+        def montar():
+            arquivo = io.BytesIO()
+            exportar(relatorio, arquivo)
+            return arquivo.getvalue()
+        return montar
+
+    st.download_button(f"⬇ Baixar {rotulo} (Excel)", data=montar_relatorio(exportar_excel),
+                       file_name=f"{nome_base}.xlsx",
+                       mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", on_click="ignore")
+    st.download_button(f"⬇ Baixar {rotulo} (CSV)", data=montar_relatorio(exportar_csv),
+                       file_name=f"{nome_base}.csv", mime="text/csv", on_click="ignore")
+
+
+# Resumo da validação (validacao_xte.py), as primeiras linhas do relatório e o relatório completo
+def mostrar_validacao(relatorio):
+    if relatorio.empty:
+        st.success("✅ Planilha validada: nenhum problema encontrado.")
+        return
+
+    st.warning(f"⚠️ A validação encontrou {len(relatorio)} problema(s) na planilha.")
+    st.dataframe(resumo_validacao(relatorio), hide_index=True)
+    st.caption("Primeiras linhas com problema:")
+    st.dataframe(relatorio.head(100), hide_index=True)
+    baixar_relatorio(relatorio, "relatório de validação", "validacao_planilha")
+
+
+# Guias/procedimentos repetidos entre os arquivos (duplicatas_xte.py)
+def mostrar_duplicatas(relatorio, nivel):
+    if relatorio.empty:
+        st.success("✅ Nenhuma guia ou procedimento repetido entre os arquivos.")
+        return
+
+    chaves = relatorio["Duplicata"].nunique()
+    divergentes = relatorio.loc[relatorio["Situação"] == "divergente", "Duplicata"].nunique()
+    st.warning(f"⚠️ {chaves} {nivel}(s) aparecem em mais de um arquivo; {divergentes} com conteúdo diferente "
+               "entre os arquivos.")
+    st.dataframe(relatorio.head(100), hide_index=True)
+    baixar_relatorio(relatorio, "relatório de duplicatas", "duplicatas")
+
+
+# Trabalhos em segundo plano desta sessão do navegador
+def trabalhos_da_sessao():
+    if "trabalhos" not in st.session_state:
+        st.session_state["trabalhos"] = ArmazemTrabalhos()
+    return st.session_state["trabalhos"]
+
+
+# Validação e geração da planilha enviada, rodando como trabalho (trabalhos.py). Não usa o
+# Streamlit: o progresso vai para `trabalho.andamento` e o ZIP fica em `trabalho.artefatos`.
+def gerar_planilha_em_segundo_plano(trabalho, nome, dados, opcoes):
+    excel_file = io.BytesIO(dados)
+    excel_file.name = nome
+    perfil = [] if opcoes["medir_etapas"] else None
+    resultado = {"perfil": perfil, "relatorio": None}
+
+    # Fora do modo em blocos a planilha lida para a validação é a mesma usada na geração;
+    # em blocos ela é lida de novo, origem por origem
+    planilha = excel_file
+    if opcoes["validar"]:
+        trabalho.andamento["mensagem"] = "🔎 Validando a planilha..."
+        with perfilar(nome) as coletor:
+            if opcoes["em_blocos"]:
+                relatorio = validar_em_blocos(excel_file)
+                excel_file.seek(0)
+            else:
+                with medir("leitura_planilha") as medida:
+                    planilha = ler_planilha(excel_file)
+                    medida["linhas"] = len(planilha)
+                relatorio = validar_planilha(planilha)
+        if perfil is not None:
+            perfil.extend(coletor.registros())
+        resultado["relatorio"] = relatorio
+        if opcoes["interromper"] and not relatorio.empty:
+            return resultado
+
+    def atualizar_progresso(i, filename):
+        trabalho.andamento["mensagem"] = f"📄 Gerado {i + 1}º arquivo: {filename}"
+
+    # Os arquivos vão direto para um ZIP temporário (em disco quando passa de
+    # TAMANHO_MAXIMO_ZIP_MEMORIA), um de cada vez, e só existem lá dentro
+    trabalho.andamento["mensagem"] = "📄 Gerando arquivos..."
+    xml_zip = trabalho.artefatos["arquivos_xml.zip"] = tempfile.SpooledTemporaryFile(max_size=TAMANHO_MAXIMO_ZIP_MEMORIA)
+    reaproveitados = []
+    xml_names = gerar_xte_em_zip(
+        planilha, xml_zip, extensao=".xml", max_workers=opcoes["processos"], ao_concluir=atualizar_progresso,
+        em_blocos=opcoes["em_blocos"], perfil=perfil, reaproveitar=opcoes["reaproveitar"],
+        forcar=opcoes["forcar"], reaproveitados=reaproveitados, max_guias=opcoes["max_guias"],
+        max_bytes=opcoes["max_bytes"]
+    )
+    xml_zip.seek(0)
+    with zipfile.ZipFile(xml_zip) as zipf:
+        exemplo = zipf.read(xml_names[0])
+    resultado.update(xml_names=xml_names, reaproveitados=reaproveitados, exemplo=exemplo)
+    return resultado
 
-    if hasattr(excel_file, 'name') and excel_file.name.endswith('.csv'):
-        df = pd.read_csv(excel_file, dtype=str, sep=';')
-    else:
-        df = pd.read_excel(excel_file, dtype=str)
 
-    # --- Função Auxiliar 'sub' ---
-    def sub(parent, tag, value, is_date=False, force=False):
-        if pd.isna(value) or str(value).strip() == '':
-            if not force:
-                return
-            else:
-                ET.SubElement(parent, f"ans:{tag}").text = "00"
-                return
-        text = str(value).strip()
-        if is_date and text:
-            original_text = text
-            text = original_text
-            for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
-                try:
-                    text = datetime.strptime(original_text, fmt).strftime("%Y-%m-%d")
-                    break
-                except ValueError:
-                    continue
-        if text:
-            ET.SubElement(parent, f"ans:{tag}").text = text
-
-    def extrair_texto(elemento):
-        textos = []
-        if elemento.text: textos.append(elemento.text.strip())
-        for filho in elemento:
-            textos.extend(extrair_texto(filho))
-            if filho.tail: textos.append(filho.tail.strip())
-        return textos
-
-    arquivos_gerados = {}
-    if "Nome da Origem" not in df.columns:
-        raise ValueError("A coluna 'Nome da Origem' é obrigatória no Excel.")
-
-    # --- Início da Geração do XML ---
-    for nome_arquivo, df_origem in df.groupby("Nome da Origem"):
-        if df_origem.empty: continue
-
-        agrupado = df_origem.groupby(
-            ["numeroGuia_prestador", "numeroGuia_operadora", "identificacaoReembolso"], dropna=False
-        )
-        
-        root = ET.Element("ans:mensagemEnvioANS", attrib={
-            "xmlns:xsi": "http://www.w3.org/2001/XMLSchema-instance", "xmlns:xsd": "http://www.w3.org/2001/XMLSchema",
-            "xsi:schemaLocation": f"{ns} {ns}/tissMonitoramentoV1_05_00.xsd", "xmlns:ans": ns
-        })
-        
-        linha_cabecalho = df_origem.iloc[0]
-        
-        # --- Bloco do Cabeçalho ---
-        cabecalho = ET.SubElement(root, "ans:cabecalho")
-        identificacaoTransacao = ET.SubElement(cabecalho, "ans:identificacaoTransacao")
-        sub(identificacaoTransacao, "tipoTransacao", "MONITORAMENTO")
-        
-        # AJUSTE FINAL: Geração do numeroLote com Minuto e Segundo
-        competencia = linha_cabecalho.get("competenciaLote", "")
-        if competencia and len(competencia) == 6 and competencia.isdigit():
-            numero_lote_final = f"{competencia}{minuto_e_segundos_atuais}"
-        else:
-            ano_e_mes_atuais = agora_no_fuso_desejado.strftime("%Y%m")
-            numero_lote_final = f"{ano_e_mes_atuais}{minuto_e_segundos_atuais}"
-
-        sub(identificacaoTransacao, "numeroLote", numero_lote_final)
-        sub(identificacaoTransacao, "competenciaLote", linha_cabecalho.get("competenciaLote"))
-        sub(identificacaoTransacao, "dataRegistroTransacao", data_atual)
-        sub(identificacaoTransacao, "horaRegistroTransacao", hora_atual)
-        sub(cabecalho, "registroANS", linha_cabecalho.get("registroANS_cabecalho"))
-        sub(cabecalho, "versaoPadrao", linha_cabecalho.get("versaoPadrao_cabecalho", "1.05.00"))
-
-        mensagem = ET.SubElement(root, "ans:Mensagem")
-        op_ans = ET.SubElement(mensagem, "ans:operadoraParaANS")
-
-        # --- Loop Principal para cada Guia ---
-        for _, grupo_guia_key in agrupado:
-            linha_guia = grupo_guia_key.iloc[0]
-            guia = ET.SubElement(op_ans, "ans:guiaMonitoramento")
-
-            # --- Mapeamento Estruturado da Guia (Nível da Guia) ---
-            sub(guia, "tipoRegistro", linha_guia.get("tipoRegistro"))
-            sub(guia, "versaoTISSPrestador", linha_guia.get("versaoTISSPrestador"))
-            sub(guia, "formaEnvio", linha_guia.get("formaEnvio"))
-            
-            dadosContratadoExecutante_el = ET.SubElement(guia, "ans:dadosContratadoExecutante")
-            sub(dadosContratadoExecutante_el, "CNES", linha_guia.get("CNES"))
-            sub(dadosContratadoExecutante_el, "identificadorExecutante", linha_guia.get("identificadorExecutante"))
-            sub(dadosContratadoExecutante_el, "codigoCNPJ_CPF", linha_guia.get("codigoCNPJ_CPF"))
-            sub(dadosContratadoExecutante_el, "municipioExecutante", linha_guia.get("municipioExecutante"))
-
-            sub(guia, "registroANSOperadoraIntermediaria", linha_guia.get("registroANSOperadoraIntermediaria"))
-            sub(guia, "tipoAtendimentoOperadoraIntermediaria", linha_guia.get("tipoAtendimentoOperadoraIntermediaria"))
-
-            dadosBeneficiario_el = ET.SubElement(guia, "ans:dadosBeneficiario")
-            identBeneficiario_el = ET.SubElement(dadosBeneficiario_el, "ans:identBeneficiario")
-            sub(identBeneficiario_el, "numeroCartaoNacionalSaude", linha_guia.get("numeroCartaoNacionalSaude"))
-            sub(identBeneficiario_el, "cpfBeneficiario", linha_guia.get("cpfBeneficiario"))
-            sub(identBeneficiario_el, "sexo", linha_guia.get("sexo"))
-            sub(identBeneficiario_el, "dataNascimento", linha_guia.get("dataNascimento"), is_date=True)
-            sub(identBeneficiario_el, "municipioResidencia", linha_guia.get("municipioResidencia"))
-            sub(dadosBeneficiario_el, "numeroRegistroPlano", linha_guia.get("numeroRegistroPlano"))
-
-            sub(guia, "tipoEventoAtencao", linha_guia.get("tipoEventoAtencao"))
-            sub(guia, "origemEventoAtencao", linha_guia.get("origemEventoAtencao"))
-            sub(guia, "numeroGuia_prestador", linha_guia.get("numeroGuia_prestador"), force=True)
-            sub(guia, "numeroGuia_operadora", linha_guia.get("numeroGuia_operadora"), force=True)
-            
-            origem_evento = linha_guia.get("origemEventoAtencao")
-            valor_reembolso = ""
-            if origem_evento in ['1', '2', '3']:
-                valor_reembolso = "00000000000000000000"
-            else:
-                valor_reembolso = linha_guia.get("identificacaoReembolso")
-            sub(guia, "identificacaoReembolso", valor_reembolso)
-            
-            if pd.notna(linha_guia.get("formaRemuneracao")) or pd.notna(linha_guia.get("valorRemuneracao")):
-                formasRemuneracao_el = ET.SubElement(guia, "ans:formasRemuneracao")
-                sub(formasRemuneracao_el, "formaRemuneracao", linha_guia.get("formaRemuneracao"))
-                sub(formasRemuneracao_el, "valorRemuneracao", linha_guia.get("valorRemuneracao"))
-            
-            sub(guia, "guiaSolicitacaoInternacao", linha_guia.get("guiaSolicitacaoInternacao"))
-            sub(guia, "dataSolicitacao", linha_guia.get("dataSolicitacao"), is_date=True)
-            sub(guia, "numeroGuiaSPSADTPrincipal", linha_guia.get("numeroGuiaSPSADTPrincipal"))
-            sub(guia, "dataAutorizacao", linha_guia.get("dataAutorizacao"), is_date=True)
-            sub(guia, "dataRealizacao", linha_guia.get("dataRealizacao"), is_date=True)
-            sub(guia, "dataInicialFaturamento", linha_guia.get("dataInicialFaturamento"), is_date=True)
-            sub(guia, "dataFimPeriodo", linha_guia.get("dataFimPeriodo"), is_date=True)
-            sub(guia, "dataProtocoloCobranca", linha_guia.get("dataProtocoloCobranca"), is_date=True)
-            sub(guia, "dataPagamento", linha_guia.get("dataPagamento"), is_date=True)
-            sub(guia, "dataProcessamentoGuia", linha_guia.get("dataProcessamentoGuia"), is_date=True)
-            sub(guia, "tipoConsulta", linha_guia.get("tipoConsulta"))
-            sub(guia, "cboExecutante", linha_guia.get("cboExecutante"))
-            sub(guia, "indicacaoRecemNato", linha_guia.get("indicacaoRecemNato"))
-            sub(guia, "indicacaoAcidente", linha_guia.get("indicacaoAcidente"))
-            sub(guia, "caraterAtendimento", linha_guia.get("caraterAtendimento"))
-            sub(guia, "tipoInternacao", linha_guia.get("tipoInternacao"))
-            sub(guia, "regimeInternacao", linha_guia.get("regimeInternacao"))
-            
-            if pd.notna(linha_guia.get("diagnosticoCID")):
-                diagnosticosCID10_el = ET.SubElement(guia, "ans:diagnosticosCID10")
-                sub(diagnosticosCID10_el, "diagnosticoCID", linha_guia.get("diagnosticoCID"))
-            
-            sub(guia, "tipoAtendimento", linha_guia.get("tipoAtendimento"))
-            sub(guia, "regimeAtendimento", linha_guia.get("regimeAtendimento"))
-            sub(guia, "tipoFaturamento", linha_guia.get("tipoFaturamento"))
-            sub(guia, "diariasAcompanhante", linha_guia.get("diariasAcompanhante"))
-            sub(guia, "diariasUTI", linha_guia.get("diariasUTI"))
-            sub(guia, "motivoSaida", linha_guia.get("motivoSaida"))
-
-            valoresGuia_el = ET.SubElement(guia, "ans:valoresGuia")
-            sub(valoresGuia_el, "valorTotalInformado", linha_guia.get("valorTotalInformado"))
-            sub(valoresGuia_el, "valorProcessado", linha_guia.get("valorProcessado"))
-            sub(valoresGuia_el, "valorTotalPagoProcedimentos", linha_guia.get("valorTotalPagoProcedimentos"))
-            sub(valoresGuia_el, "valorTotalDiarias", linha_guia.get("valorTotalDiarias"))
-            sub(valoresGuia_el, "valorTotalTaxas", linha_guia.get("valorTotalTaxas"))
-            sub(valoresGuia_el, "valorTotalMateriais", linha_guia.get("valorTotalMateriais"))
-            sub(valoresGuia_el, "valorTotalOPME", linha_guia.get("valorTotalOPME"))
-            sub(valoresGuia_el, "valorTotalMedicamentos", linha_guia.get("valorTotalMedicamentos"))
-            sub(valoresGuia_el, "valorGlosaGuia", linha_guia.get("valorGlosaGuia"))
-            sub(valoresGuia_el, "valorPagoGuia", linha_guia.get("valorPagoGuia"))
-            sub(valoresGuia_el, "valorPagoFornecedores", linha_guia.get("valorPagoFornecedores"))
-            sub(valoresGuia_el, "valorTotalTabelaPropria", linha_guia.get("valorTotalTabelaPropria"))
-            sub(valoresGuia_el, "valorTotalCoParticipacao", linha_guia.get("valorTotalCoParticipacao"))
-
-            sub(guia, "declaracaoNascido", linha_guia.get("declaracaoNascido"))
-            sub(guia, "declaracaoObito", linha_guia.get("declaracaoObito"))
-
-            # --- Loop Interno para cada Procedimento da Guia ---
-            for _, proc_linha in grupo_guia_key.iterrows():
-                if pd.notna(proc_linha.get("codigoProcedimento")) or pd.notna(proc_linha.get("grupoProcedimento")):
-                    procedimentos_el = ET.SubElement(guia, "ans:procedimentos")
-                    identProcedimento_el = ET.SubElement(procedimentos_el, "ans:identProcedimento")
-                    
-                    codigo_tabela = proc_linha.get("codigoTabela")
-                    if codigo_tabela == "0":
-                        codigo_tabela = "00"
-                    sub(identProcedimento_el, "codigoTabela", codigo_tabela)
-                    
-                    Procedimento_el = ET.SubElement(identProcedimento_el, "ans:Procedimento")
-                    
-                    if pd.notna(proc_linha.get("grupoProcedimento")):
-                        sub(Procedimento_el, "grupoProcedimento", proc_linha.get("grupoProcedimento"))
-                    elif pd.notna(proc_linha.get("codigoProcedimento")):
-                        sub(Procedimento_el, "codigoProcedimento", proc_linha.get("codigoProcedimento"))
-                    
-                    sub(procedimentos_el, "quantidadeInformada", proc_linha.get("quantidadeInformada"))
-                    sub(procedimentos_el, "valorInformado", proc_linha.get("valorInformado"), force=True)
-                    sub(procedimentos_el, "quantidadePaga", proc_linha.get("quantidadePaga"))
-                    sub(procedimentos_el, "unidadeMedida", proc_linha.get("unidadeMedida"))
-                    sub(procedimentos_el, "valorPagoProc", proc_linha.get("valorPagoProc"))
-                    sub(procedimentos_el, "valorPagoFornecedor", proc_linha.get("valorPagoFornecedor"), force=True)
-                    sub(procedimentos_el, "valorCoParticipacao", proc_linha.get("valorCoParticipacao"))
-
-        # --- Finalização com Hash e Formatação ---
-        conteudo_cabecalho = ''.join(extrair_texto(cabecalho))
-        conteudo_mensagem = ''.join(extrair_texto(mensagem))
-        conteudo_para_hash = conteudo_cabecalho + conteudo_mensagem
-        hash_value = hashlib.md5(conteudo_para_hash.encode('iso-8859-1')).hexdigest()
-        epilogo = ET.SubElement(root, "ans:epilogo")
-        ET.SubElement(epilogo, "ans:hash").text = hash_value
-        xml_string = ET.tostring(root, encoding="utf-8", method="xml")
-        dom = minidom.parseString(xml_string)
-        final_pretty = dom.toprettyxml(indent="  ", encoding="iso-8859-1")
-        nome_base, _ = os.path.splitext(nome_arquivo)
-        nome_limpo = re.sub(r'[^a-zA-Z0-9_\-]', '_', nome_base)
-        arquivos_gerados[f"{nome_limpo}.xml"] = final_pretty
-        arquivos_gerados[f"{nome_limpo}.xte"] = final_pretty
-
-    return arquivos_gerados
 ######################################### STREAM LIT #########################################  
 
 
@@ -396,7 +180,8 @@ st.markdown("""
 st.sidebar.title("AM Consultoria")
 menu = st.sidebar.radio("Escolha uma operação:", [
     "Converter XTE para Excel e CSV",
-    "Converter Excel para XTE/XML"
+    "Converter Excel para XTE/XML",
+    "Consultar base local"
 ])
 
 st.title("Conversor Avançado de XTE ⇄ Excel")
@@ -405,7 +190,7 @@ if menu == "Converter XTE para Excel e CSV":
     st.subheader("📄➡📊 Transformar arquivos .XTE em Excel e CSV")
     
     st.markdown("""
-    Este modo permite que você envie **dois ou mais arquivos `.xte`** e receba:
+    Este modo permite que você envie **dois ou mais arquivos `.xte`** (soltos ou dentro de arquivos `.zip`) e receba:
 
     - Um **arquivo Excel (.xlsx)** consolidado.
     - Um **arquivo CSV (.csv)** com os mesmos dados.
@@ -413,50 +198,232 @@ if menu == "Converter XTE para Excel e CSV":
     Ideal para visualizar, editar e analisar seus dados fora do sistema.
     """)
 
-    uploaded_files = st.file_uploader("Selecione os arquivos .xte", accept_multiple_files=True, type=["xte"])
+    uploaded_files = st.file_uploader("Selecione os arquivos .xte ou .zip", accept_multiple_files=True, type=["xte", "zip"])
+    modo_streaming = st.checkbox(
+        "Leitura em streaming (lotes grandes)",
+        help="Lê cada arquivo aos poucos, sem carregar o XML inteiro na memória."
+    )
+    num_processos = st.number_input(
+        "Processos em paralelo", min_value=1, max_value=workers_padrao(), value=workers_padrao(),
+        help="Quantidade de arquivos lidos ao mesmo tempo. Use 1 para processar um por vez."
+    )
+    usar_cache = st.checkbox(
+        "Reaproveitar lotes já lidos (cache em disco)", value=True,
+        help="Lotes com conteúdo idêntico a um já processado são carregados do cache, mesmo com outro nome."
+    )
+    modo_compacto = st.checkbox(
+        "Modo compacto (colunas tipadas)",
+        help="Guarda valores como números e códigos repetidos como categorias, usando bem menos memória. "
+             "Os arquivos exportados continuam com os textos originais."
+    )
+    conferir_hash = st.checkbox(
+        "Conferir hash do epílogo",
+        help="Recalcula o hash de cada arquivo e aponta os que não batem com o informado no epílogo."
+    )
+    procurar_duplicatas = st.checkbox(
+        "Procurar guias repetidas entre os arquivos",
+        help="Aponta a mesma guia (números da guia e identificação do reembolso) ou o mesmo procedimento dela "
+             "em mais de um arquivo, dizendo se o conteúdo é igual ou diferente entre eles."
+    )
+    if procurar_duplicatas:
+        nivel_duplicatas = st.radio(
+            "Comparar por:", ["procedimento", "guia"], horizontal=True,
+            format_func=lambda nivel: {"procedimento": "Procedimento da guia", "guia": "Guia inteira"}[nivel]
+        )
+        manter_duplicatas = st.radio(
+            "Antes de exportar:", [None, "primeira", "ultima"], horizontal=True,
+            format_func=lambda manter: {None: "Manter todas as linhas", "primeira": "Deixar só a do primeiro arquivo",
+                                        "ultima": "Deixar só a do último arquivo"}[manter]
+        )
+    gravar_banco = st.checkbox(
+        "Guardar os lotes na base local",
+        help="Acrescenta os lotes lidos à base local (SQLite), para consultar e totalizar depois na página "
+             "\"Consultar base local\" sem ler os arquivos de novo. Lotes que já estão na base não são repetidos."
+    )
+    medir_etapas = st.checkbox(
+        "Medir tempo por etapa",
+        help="Mostra quanto tempo, linhas e memória cada etapa (decodificação, parse, datas, exportação...) "
+             "levou em cada arquivo, para descobrir onde um lote lento gasta o tempo."
+    )
 
     if uploaded_files:
-        st.info(f"Você enviou {len(uploaded_files)} arquivos. Aguarde enquanto processamos.")
+        # Os .xte de dentro dos ZIPs são lidos direto do ZIP, depois dos arquivos soltos
+        arquivos_zip = [file for file in uploaded_files if file.name.lower().endswith(".zip")]
+        uploaded_files = [file for file in uploaded_files if file not in arquivos_zip]
+        membros_zip = {}
+        try:
+            for file in arquivos_zip:
+                membros_zip[file.name] = membros_xte_zip(file)
+        except zipfile.BadZipFile:
+            st.error(f"O arquivo {file.name} não é um ZIP válido.")
+            st.stop()
+        total_zip = sum(map(len, membros_zip.values()))
+        if arquivos_zip:
+            st.info(f"Você enviou {len(uploaded_files)} arquivos .xte e {len(arquivos_zip)} ZIP(s) com "
+                    f"{total_zip} arquivos .xte. Aguarde enquanto processamos.")
+        else:
+            st.info(f"Você enviou {len(uploaded_files)} arquivos. Aguarde enquanto processamos.")
         progress_bar = st.progress(0)
         status_text = st.empty()
         all_dfs = []
 
         total = len(uploaded_files)
         start_time = time.time()
+        perfil = [] if medir_etapas else None
+
+        if num_processos > 1 and total > 1:
+            # --- Leitura paralela: progresso e ETA pelo volume (bytes) já concluído ---
+            arquivos = [(file.name, file.getvalue()) for file in uploaded_files]
+            total_bytes = sum(len(dados) for _, dados in arquivos) or 1
+            andamento = {"arquivos": 0, "bytes": 0}
+
+            def atualizar_progresso(indice, _df):
+                andamento["arquivos"] += 1
+                andamento["bytes"] += len(arquivos[indice][1])
+                elapsed = time.time() - start_time
+                fracao = andamento["bytes"] / total_bytes
+                est_remaining = elapsed * (1 - fracao) / fracao if fracao else 0
+                progress_bar.progress(min(fracao, 1.0))
+                status_text.markdown(
+                    f"Processado {andamento['arquivos']} de {total} arquivos ({fracao:.0%} dos dados)  \
+                    Estimado restante: {int(est_remaining)} segundos 🕒"
+                )
 
-        for i, file in enumerate(uploaded_files):
-            step_start = time.time()
-            with st.spinner(f"Lendo arquivo {file.name}..."):
-                df, _, _ = parse_xte(file)
-                df['Nome da Origem'] = file.name
-                all_dfs.append(df)
-
-            elapsed = time.time() - start_time
-            avg_time = elapsed / (i + 1)
-            est_remaining = avg_time * (total - (i + 1))
+            with st.spinner(f"Lendo {total} arquivos em {num_processos} processos..."):
+                all_dfs.append(parse_xte_paralelo(
+                    arquivos, max_workers=num_processos, streaming=modo_streaming,
+                    usar_cache=usar_cache, ao_concluir=atualizar_progresso, perfil=perfil
+                ))
+        else:
+            for i, file in enumerate(uploaded_files):
+                step_start = time.time()
+                with st.spinner(f"Lendo arquivo {file.name}..."), perfilar(file.name) as coletor:
+                    if usar_cache:
+                        df = parse_xte_bytes(file.name, file.getvalue(), streaming=modo_streaming, usar_cache=True)
+                    elif modo_streaming:
+                        df = parse_xte_stream(file, file.name)
+                    else:
+                        df, _, _ = parse_xte(file)
+                    df['Nome da Origem'] = file.name
+                    all_dfs.append(df)
+                if perfil is not None:
+                    perfil.extend(coletor.registros())
+
+                elapsed = time.time() - start_time
+                avg_time = elapsed / (i + 1)
+                est_remaining = avg_time * (total - (i + 1))
+
+                percent_complete = (i + 1) / total
+                progress_bar.progress(percent_complete)
+
+                status_text.markdown(
+                    f"Processado {i + 1} de {total} arquivos ({percent_complete:.0%})  \
+                    Estimado restante: {int(est_remaining)} segundos 🕒"
+                )
 
-            percent_complete = (i + 1) / total
-            progress_bar.progress(percent_complete)
+        # --- Arquivos ZIP: vários .xte de cada ZIP lidos ao mesmo tempo, sem extrair para o disco ---
+        andamento_zip = {"arquivos": 0}
+        for file in arquivos_zip:
+            def atualizar_progresso_zip(_indice, _df):
+                andamento_zip["arquivos"] += 1
+                elapsed = time.time() - start_time
+                avg_time = elapsed / andamento_zip["arquivos"]
+                est_remaining = avg_time * (total_zip - andamento_zip["arquivos"])
+                percent_complete = andamento_zip["arquivos"] / total_zip
+                progress_bar.progress(percent_complete)
+                status_text.markdown(
+                    f"Processado {andamento_zip['arquivos']} de {total_zip} arquivos dos ZIPs ({percent_complete:.0%})  \
+                    Estimado restante: {int(est_remaining)} segundos 🕒"
+                )
 
-            status_text.markdown(
-                f"Processado {i + 1} de {total} arquivos ({percent_complete:.0%})  \
-                Estimado restante: {int(est_remaining)} segundos 🕒"
+            if not membros_zip[file.name]:
+                st.warning(f"⚠️ Nenhum arquivo .xte dentro de {file.name}.")
+                continue
+            with st.spinner(f"Lendo {len(membros_zip[file.name])} arquivos de {file.name}..."):
+                all_dfs.append(parse_xte_zip(
+                    file, max_workers=num_processos, streaming=modo_streaming, usar_cache=usar_cache,
+                    ao_concluir=atualizar_progresso_zip, perfil=perfil
+                ))
+
+        if not all_dfs:
+            st.error("Nenhum arquivo .xte para processar.")
+            st.stop()
+
+        if conferir_hash:
+            # Os membros dos ZIPs são descompactados aos poucos, conforme entram no pool
+            arquivos_hash = itertools.chain(
+                ((file.name, file.getvalue()) for file in uploaded_files),
+                *(ler_membros_zip(file) for file in arquivos_zip)
             )
+            with st.spinner("Conferindo hash dos arquivos..."):
+                hashes_df = verificar_hashes(arquivos_hash, max_workers=num_processos, perfil=perfil)
+            divergentes = hashes_df[~hashes_df['hash_confere']]
+            if divergentes.empty:
+                st.success("🔐 Hash do epílogo confere em todos os arquivos.")
+            else:
+                st.warning(f"⚠️ {len(divergentes)} arquivo(s) com hash do epílogo divergente:")
+                st.dataframe(divergentes, hide_index=True)
 
         final_df = pd.concat(all_dfs, ignore_index=True)
+        if procurar_duplicatas:
+            with st.spinner("Procurando guias repetidas..."), perfilar("consolidado") as coletor:
+                duplicatas_df = detectar_duplicatas(final_df, nivel_duplicatas)
+                if manter_duplicatas and not duplicatas_df.empty:
+                    total_antes = len(final_df)
+                    final_df = remover_duplicatas(final_df, nivel_duplicatas, manter_duplicatas)
+            if perfil is not None:
+                perfil.extend(coletor.registros())
+            mostrar_duplicatas(duplicatas_df, nivel_duplicatas)
+            if manter_duplicatas and not duplicatas_df.empty:
+                st.info(f"🧹 {total_antes - len(final_df)} linhas repetidas removidas antes da exportação.")
+        if modo_compacto:
+            with perfilar("consolidado") as coletor, medir("tipagem", len(final_df)):
+                final_df = tipar_df(final_df)
+            if perfil is not None:
+                perfil.extend(coletor.registros())
         st.success(f"✅ Processamento concluído: {len(final_df)} registros.")
+        if gravar_banco:
+            with st.spinner("Guardando os lotes na base local..."), perfilar("consolidado") as coletor:
+                gravados, existentes = gravar_no_banco(final_df)
+            if perfil is not None:
+                perfil.extend(coletor.registros())
+            st.info(f"🗄️ {len(gravados)} lote(s) guardado(s) na base local"
+                    + (f"; {len(existentes)} já estava(m) lá." if existentes else "."))
+        if modo_compacto:
+            st.caption(f"Memória ocupada pelos dados: {final_df.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB")
 
         st.subheader("🔍 Pré-visualização dos dados:")
         st.dataframe(final_df.head(20))
 
-        excel_buffer = io.BytesIO()
-        final_df.to_excel(excel_buffer, index=False)
-
-        csv_buffer = io.StringIO()
-        final_df.to_csv(csv_buffer, index=False, sep=";", encoding="utf-8", float_format='%.2f')
+        # Os arquivos só são montados quando o botão é clicado, em blocos e num temporário
+        # (em disco acima de TAMANHO_MAXIMO_ZIP_MEMORIA); o modo compacto volta a texto aos poucos
+        def montar_download(exportar, nome, **opcoes):
+            def montar():
+                with tempfile.SpooledTemporaryFile(max_size=TAMANHO_MAXIMO_ZIP_MEMORIA) as arquivo, perfilar(nome) as coletor:
+                    exportar(final_df, arquivo, **opcoes)
+                    arquivo.seek(0)
+                    conteudo = arquivo.read()
+                if perfil is not None:
+                    perfil.extend(coletor.registros())
+                return conteudo
+            return montar
+
+        excel_em_arquivos = False
+        if len(final_df) > LIMITE_LINHAS_EXCEL - 1:
+            st.info(f"ℹ️ São mais de {LIMITE_LINHAS_EXCEL - 1:,} registros, o limite de uma planilha do Excel.".replace(",", "."))
+            excel_em_arquivos = st.radio(
+                "Como dividir o Excel:", ["Em várias abas", "Em vários arquivos (ZIP)"], horizontal=True
+            ) == "Em vários arquivos (ZIP)"
+
+        if excel_em_arquivos:
+            st.download_button("⬇ Baixar Excel Consolidado (ZIP)", data=montar_download(exportar_excel_em_arquivos, "dados_consolidados_xlsx.zip"), file_name="dados_consolidados_xlsx.zip", mime="application/zip", on_click="ignore")
+        else:
+            st.download_button("⬇ Baixar Excel Consolidado", data=montar_download(exportar_excel, "dados_consolidados.xlsx"), file_name="dados_consolidados.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", on_click="ignore")
+        st.download_button("⬇ Baixar CSV Consolidado", data=montar_download(exportar_csv, "dados_consolidados.csv"), file_name="dados_consolidados.csv", mime="text/csv", on_click="ignore")
+        st.download_button("⬇ Baixar Parquet Consolidado", data=montar_download(exportar_parquet, "dados_consolidados.parquet"), file_name="dados_consolidados.parquet", mime="application/vnd.apache.parquet", on_click="ignore")
 
-        st.download_button("⬇ Baixar Excel Consolidado", data=excel_buffer.getvalue(), file_name="dados_consolidados.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-        st.download_button("⬇ Baixar CSV Consolidado", data=csv_buffer.getvalue(), file_name="dados_consolidados.csv", mime="text/csv")
+        if perfil is not None:
+            mostrar_perfil(perfil, "perfil_leitura.json")
 
 elif menu == "Converter Excel para XTE/XML":
     st.subheader("📊➡📄 Transformar Excel em arquivos .XTE/XML")
@@ -473,21 +440,87 @@ elif menu == "Converter Excel para XTE/XML":
     """)
 
     excel_file = st.file_uploader("Selecione o arquivo Excel (.xlsx ou .csv)", type=["xlsx", "csv"])
+    processos_geracao = st.number_input(
+        "Processos em paralelo", min_value=1, max_value=workers_padrao(), value=workers_padrao(),
+        help="Quantidade de arquivos de origem (ou blocos de guias, ao dividir) gerados ao mesmo tempo. "
+             "Use 1 para gerar um por vez."
+    )
+    leitura_em_blocos = st.checkbox(
+        "Ler a planilha em blocos (planilhas grandes)",
+        help="Lê a planilha aos poucos e gera cada arquivo assim que as linhas da origem terminam, "
+             "sem carregar a planilha inteira. As linhas de cada 'Nome da Origem' precisam estar em sequência."
+    )
+    reaproveitar = st.checkbox(
+        "Reaproveitar arquivos de origens sem alteração", value=True,
+        help="Origens com as mesmas linhas de uma geração anterior não são geradas de novo: o arquivo gerado "
+             "antes (com o numeroLote, a data e a hora daquela geração) é reaproveitado."
+    )
+    forcar_geracao = st.checkbox("Gerar todos os arquivos de novo", disabled=not reaproveitar)
+    dividir_arquivos = st.checkbox(
+        "Dividir origens grandes em vários arquivos",
+        help="Origens acima do limite saem em partes (<origem>_parte01, _parte02...), cada uma com seu "
+             "numeroLote e seu hash. Use 0 para não limitar."
+    )
+    max_guias = max_mb = 0
+    if dividir_arquivos:
+        colunas_divisao = st.columns(2)
+        max_guias = colunas_divisao[0].number_input("Máximo de guias por arquivo", min_value=0, value=0, step=1000)
+        max_mb = colunas_divisao[1].number_input("Máximo de MB por arquivo", min_value=0.0, value=0.0, step=10.0)
+    validar_antes = st.checkbox(
+        "Validar a planilha antes de gerar", value=True,
+        help="Confere campos obrigatórios, datas, valores, CPF/CNS/CNPJ e o total de cada guia contra a soma "
+             "dos procedimentos, com um relatório das linhas com problema."
+    )
+    interromper_se_invalida = st.checkbox(
+        "Não gerar os arquivos se a validação encontrar problemas", disabled=not validar_antes
+    )
+    medir_etapas = st.checkbox(
+        "Medir tempo por etapa",
+        help="Mostra quanto tempo, linhas e memória cada etapa (leitura da planilha, montagem, serialização, "
+             "ZIP...) levou em cada arquivo gerado."
+    )
 
     if excel_file:
-        st.info("🔄 Processando o arquivo...")
+        # A validação e a geração rodam em segundo plano (trabalhos.py), guardadas na sessão pela
+        # chave do arquivo enviado e das opções: os reruns do Streamlit (downloads, cliques, outra
+        # opção e volta) reaproveitam o trabalho em andamento ou concluído em vez de refazê-lo
+        dados_planilha = excel_file.getvalue()
+        opcoes = {
+            "processos": processos_geracao, "em_blocos": leitura_em_blocos, "reaproveitar": reaproveitar,
+            "forcar": forcar_geracao, "validar": validar_antes, "interromper": interromper_se_invalida,
+            "medir_etapas": medir_etapas, "max_guias": int(max_guias) or None,
+            "max_bytes": int(max_mb * 1024 * 1024) or None,
+        }
+        trabalho = trabalhos_da_sessao().obter(
+            chave_trabalho(dados_planilha, excel_file.name, sorted(opcoes.items())),
+            gerar_planilha_em_segundo_plano, excel_file.name, dados_planilha, opcoes
+        )
 
-        try:
+        if not trabalho.concluido:
+            st.info("🔄 Processando o arquivo...")
+            status = st.empty()
             with st.spinner("Gerando arquivos..."):
-                updated_files = gerar_xte_do_excel(excel_file)
+                while not trabalho.aguardar(0.5):
+                    status.markdown(f"{trabalho.andamento.get('mensagem', '')} - ⏱ {int(trabalho.segundos)}s")
+            status.empty()
 
-            # Separar XMLs e XTEs
-            xml_files = {k: v for k, v in updated_files.items() if k.endswith(".xml")}
-            xte_files = {k.replace(".xml", ".xte"): v for k, v in updated_files.items() if k.endswith(".xml")}
+        try:
+            resultado = trabalho.obter_resultado()
+            perfil = resultado["perfil"]
+            if resultado["relatorio"] is not None:
+                mostrar_validacao(resultado["relatorio"])
+            if "xml_names" not in resultado:
+                # Interrompida pela validação
+                st.stop()
+
+            xml_names = resultado["xml_names"]
+            if resultado["reaproveitados"]:
+                st.info(f"♻️ {len(resultado['reaproveitados'])} de {len(xml_names)} arquivos reaproveitados de "
+                        "gerações anteriores (origens sem alteração).")
 
             # Exemplo de preview
-            first_key = next(iter(xml_files))
-            first_file = xml_files[first_key]
+            first_key = xml_names[0]
+            first_file = resultado["exemplo"]
 
             st.download_button(
                 f"⬇ Baixar exemplo: {first_key}",
@@ -503,67 +536,74 @@ elif menu == "Converter Excel para XTE/XML":
                 mime="application/xml"
             )
 
-            # Compactar XMLs automaticamente
-            st.info("📦 Compactando arquivos XML...")
-            xml_zip_buffer = io.BytesIO()
-            start_time = time.time()
-            progress = st.progress(0)
-            status = st.empty()
-            total = len(xml_files)
-
-            with zipfile.ZipFile(xml_zip_buffer, "w") as zipf:
-                for i, (filename, content) in enumerate(xml_files.items()):
-                    zipf.writestr(filename, content)
-                    elapsed = time.time() - start_time
-                    avg = elapsed / (i + 1)
-                    remaining = avg * (total - (i + 1))
-                    progress.progress((i + 1) / total)
-                    status.markdown(f"📄 Adicionando {i + 1}/{total} arquivos XML - ⏳ Restante: {int(remaining)}s")
-
-            st.success("✅ Arquivo ZIP com XMLs pronto!")
+            st.success(f"✅ Arquivo ZIP com {len(xml_names)} XMLs pronto! (gerado em {trabalho.segundos:.0f}s)")
             st.download_button(
                 "⬇ Baixar ZIP de XMLs",
-                data=xml_zip_buffer.getvalue(),
+                data=lambda: trabalho.ler_artefato("arquivos_xml.zip"),
                 file_name="arquivos_xml.zip",
-                mime="application/zip"
+                mime="application/zip",
+                on_click="ignore"
             )
 
-            # Botão para gerar e baixar XTEs
-            if st.button("📁 Gerar e Baixar Arquivo ZIP com XTEs"):
-                st.info("📦 Compactando arquivos XTE...")
-                xte_zip_buffer = io.BytesIO()
-                start_time = time.time()
-                progress_xte = st.progress(0)
-                status_xte = st.empty()
-                total_xte = len(xte_files)
-
-                with zipfile.ZipFile(xte_zip_buffer, "w") as zipf:
-                    for i, (filename, content) in enumerate(xte_files.items()):
-                        zipf.writestr(filename, content)
-                        elapsed = time.time() - start_time
-                        avg = elapsed / (i + 1)
-                        remaining = avg * (total_xte - (i + 1))
-                        progress_xte.progress((i + 1) / total_xte)
-                        status_xte.markdown(f"📄 Adicionando {i + 1}/{total_xte} arquivos XTE - ⏳ Restante: {int(remaining)}s")
-
-                st.success("✅ Arquivo ZIP com XTEs pronto!")
-                st.download_button(
-                    "⬇ Baixar ZIP de XTEs",
-                    data=xte_zip_buffer.getvalue(),
-                    file_name="arquivos_xte.zip",
-                    mime="application/zip"
-                )
+            # ZIP de XTEs: mesmo conteúdo, só a extensão muda. É montado a partir do ZIP de
+            # XMLs no primeiro clique, sem gerar os arquivos de novo, e fica guardado no trabalho.
+            def montar_zip_xte():
+                xte_zip = tempfile.SpooledTemporaryFile(max_size=TAMANHO_MAXIMO_ZIP_MEMORIA)
+                with perfilar("arquivos_xte.zip") as coletor, medir("zip", len(xml_names)):
+                    trocar_extensao_zip(trabalho.artefatos["arquivos_xml.zip"], xte_zip, ".xte")
+                if perfil is not None:
+                    perfil.extend(coletor.registros())
+                return xte_zip
+
+            st.download_button(
+                "📁 Baixar Arquivo ZIP com XTEs",
+                data=lambda: trabalho.ler_artefato("arquivos_xte.zip", montar_zip_xte),
+                file_name="arquivos_xte.zip",
+                mime="application/zip",
+                on_click="ignore"
+            )
+
+            if perfil is not None:
+                mostrar_perfil(perfil, "perfil_geracao.json")
 
         except Exception as e:
             st.error(f"Erro durante o processamento: {str(e)}")
             st.error("Verifique se o arquivo Excel possui a estrutura correta.")
 
+elif menu == "Consultar base local":
+    st.subheader("🗄️ Consultar os lotes guardados na base local")
+    st.markdown("""
+    Consulta os lotes guardados pela opção **"Guardar os lotes na base local"** da leitura de XTE, sem
+    ler os arquivos de novo.
+    """)
 
-
-
-
-
-
-
-
-
+    if not CAMINHO_BANCO.exists():
+        st.info("A base local ainda está vazia. Leia alguns lotes com a opção \"Guardar os lotes na base local\".")
+        st.stop()
+
+    lotes = lotes_no_banco()
+    st.caption(f"{len(lotes)} lote(s) em {CAMINHO_BANCO} ({CAMINHO_BANCO.stat().st_size / 1024 ** 2:.1f} MB)")
+
+    st.markdown("#### Filtros")
+    colunas_filtro = st.columns(4)
+    filtros = {
+        coluna: colunas_filtro[i % 4].text_input(rotulo, key=f"filtro_{coluna}")
+        for i, (coluna, rotulo) in enumerate(COLUNAS_CONSULTA.items())
+    }
+
+    st.markdown("#### Totais por competência e operadora")
+    st.caption("Valores das guias, contados uma vez por guia. Usa só os filtros de competência e registro ANS.")
+    totais = totais_por_competencia({coluna: filtros[coluna] for coluna in ("competenciaLote", "registroANS_cabecalho")})
+    st.dataframe(totais, hide_index=True)
+
+    st.markdown("#### Registros")
+    colunas_pagina = st.columns(2)
+    por_pagina = colunas_pagina[1].selectbox("Linhas por página", [50, 100, 500, 1000], index=1)
+    pagina = colunas_pagina[0].number_input("Página", min_value=1, value=1)
+    registros, total, segundos = consultar_registros(filtros, pagina, por_pagina)
+    paginas = max(-(-total // por_pagina), 1)
+    st.caption(f"{total} registro(s) encontrado(s); página {pagina} de {paginas} (consulta em {segundos * 1000:.0f} ms)")
+    st.dataframe(registros, hide_index=True)
+
+    with st.expander("Lotes guardados"):
+        st.dataframe(lotes.drop(columns="assinatura"), hide_index=True)
@@ -0,0 +1,73 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def workers_padrao():
+    return os.cpu_count() or 1
+
+
+# Tarefa do pool que traz a própria função (tarefas de tipos diferentes no mesmo pool)
+def chamar(funcao, *args):
+    return funcao(*args)
+
+
+# --- Execução em pool de processos ---
+# Roda funcao(*args) para cada tupla de `tarefas` e devolve os resultados na mesma ordem
+# das tarefas, não na ordem em que terminaram. `ao_concluir(indice, resultado)` é chamado
+# no processo principal a cada tarefa concluída (para barra de progresso/ETA).
+# Usa "spawn" porque o Streamlit roda com várias threads e fork nesse cenário não é seguro.
+def executar_em_paralelo(funcao, tarefas, max_workers=None, ao_concluir=None, initializer=None, initargs=()):
+    tarefas = list(tarefas)
+    resultados = [None] * len(tarefas)
+    max_workers = min(max_workers or workers_padrao(), max(len(tarefas), 1))
+
+    # Com um worker só (ou uma tarefa só) não vale a pena subir processos
+    if max_workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for i, args in enumerate(tarefas):
+            resultados[i] = funcao(*args)
+            if ao_concluir:
+                ao_concluir(i, resultados[i])
+        return resultados
+
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=contexto,
+                             initializer=initializer, initargs=initargs) as executor:
+        futuros = {executor.submit(funcao, *args): i for i, args in enumerate(tarefas)}
+        for futuro in as_completed(futuros):
+            i = futuros[futuro]
+            resultados[i] = futuro.result()
+            if ao_concluir:
+                ao_concluir(i, resultados[i])
+    return resultados
+
+
+# Versão em fluxo: entrega os resultados na ordem das tarefas assim que cada um fica pronto,
+# sem esperar o fim de todas. No máximo 2 tarefas por worker ficam submetidas de cada vez,
+# então só alguns resultados ficam na memória mesmo com milhares de tarefas. `tarefas` pode
+# ser um gerador: cada tarefa só é consumida quando há vaga para ela no pool.
+def iterar_em_paralelo(funcao, tarefas, max_workers=None, initializer=None, initargs=()):
+    max_workers = max_workers or workers_padrao()
+    if hasattr(tarefas, "__len__"):
+        max_workers = min(max_workers, max(len(tarefas), 1))
+
+    if max_workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for args in tarefas:
+            yield funcao(*args)
+        return
+
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=contexto,
+                             initializer=initializer, initargs=initargs) as executor:
+        futuros = deque()
+        for args in tarefas:
+            futuros.append(executor.submit(funcao, *args))
+            if len(futuros) >= 2 * max_workers:
+                yield futuros.popleft().result()
+        while futuros:
+            yield futuros.popleft().result()
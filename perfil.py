@@ -0,0 +1,164 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import pandas as pd
+
+
+# --- Perfil de desempenho por etapa ---
+# Mede tempo, linhas e variação de memória (RSS) de cada etapa de cada arquivo. A leitura,
+# a geração e a exportação marcam suas etapas com `medir(...)`, que só registra alguma coisa
+# dentro de um `perfilar(arquivo)` (ou `com_perfil` num worker); fora disso não custa nada.
+# Etapas medidas dentro de outra são descontadas dela, então os tempos somam o total.
+ETAPAS = {
+    "leitura_planilha": "Leitura da planilha",
+    "validacao": "Validação da planilha",
+    "decodificacao": "Decodificação",
+    "parse_xml": "Parse do XML",
+    "achatamento": "Achatamento das guias",
+    "datas": "Normalização de datas",
+    "dataframe": "Montagem do DataFrame",
+    "duplicatas": "Guias repetidas",
+    "tipagem": "Tipagem (modo compacto)",
+    "cache": "Cache em disco",
+    "banco": "Base local (SQLite)",
+    "exportacao": "Exportação",
+    "serializacao": "Serialização do XML",
+    "divisao": "Divisão em partes",
+    "hash": "Hash",
+    "zip": "ZIP",
+}
+
+_coletor_atual = ContextVar("coletor_perfil", default=None)
+
+_PAGINA = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _rss_mb():
+    # Só no Linux; nos outros sistemas a coluna de memória fica vazia
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * _PAGINA / 1024 ** 2
+    except OSError:
+        return None
+
+
+class ColetorPerfil:
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.etapas = {}
+        # [segundos, memória] já atribuídos às etapas internas de cada etapa aberta
+        self.pilha = []
+
+    def registrar(self, etapa, segundos, memoria_mb, linhas):
+        medida = self.etapas.setdefault(etapa, {"chamadas": 0, "segundos": 0.0, "linhas": None, "memoria_mb": None})
+        medida["chamadas"] += 1
+        medida["segundos"] += segundos
+        if linhas is not None:
+            medida["linhas"] = (medida["linhas"] or 0) + linhas
+        if memoria_mb is not None:
+            medida["memoria_mb"] = (medida["memoria_mb"] or 0.0) + memoria_mb
+
+    def registros(self):
+        return [{"arquivo": self.arquivo, "etapa": etapa, **medida} for etapa, medida in self.etapas.items()]
+
+
+@contextmanager
+def ativar(coletor):
+    token = _coletor_atual.set(coletor)
+    try:
+        yield coletor
+    finally:
+        _coletor_atual.reset(token)
+
+
+def perfilar(arquivo):
+    return ativar(ColetorPerfil(arquivo))
+
+
+# Quem mede preenche `medida["linhas"]` quando sabe quantas linhas a etapa tratou
+@contextmanager
+def medir(etapa, linhas=None):
+    medida = {"linhas": linhas}
+    coletor = _coletor_atual.get()
+    if coletor is None:
+        yield medida
+        return
+
+    memoria_inicio = _rss_mb()
+    coletor.pilha.append([0.0, 0.0])
+    inicio = time.perf_counter()
+    try:
+        yield medida
+    finally:
+        segundos = time.perf_counter() - inicio
+        memoria = None if memoria_inicio is None else _rss_mb() - memoria_inicio
+        internas = coletor.pilha.pop()
+        if coletor.pilha:
+            coletor.pilha[-1][0] += segundos
+            coletor.pilha[-1][1] += memoria or 0.0
+        coletor.registrar(etapa, segundos - internas[0],
+                          None if memoria is None else memoria - internas[1], medida["linhas"])
+
+
+# Mede a produção de cada item de `iteravel` (leitura em blocos, por exemplo) no coletor
+# indicado, sem deixá-lo ativo enquanto o item é usado fora daqui
+def medir_iteracao(iteravel, etapa, coletor, linhas=len):
+    iterador = iter(iteravel)
+    fim = object()
+    while True:
+        with ativar(coletor), medir(etapa) as medida:
+            item = next(iterador, fim)
+            if item is fim:
+                return
+            medida["linhas"] = linhas(item)
+        yield item
+
+
+# Para rodar no pool de processos: devolve (resultado, registros do perfil do arquivo)
+def com_perfil(funcao, arquivo, *args):
+    with perfilar(arquivo) as coletor:
+        resultado = funcao(*args)
+    return resultado, coletor.registros()
+
+
+# --- Tabelas e JSON ---
+_COLUNAS = ["arquivo", "etapa", "chamadas", "segundos", "linhas", "memoria_mb"]
+
+
+def _ordem_etapa(etapas):
+    ordem = {etapa: i for i, etapa in enumerate(ETAPAS)}
+    return etapas.map(lambda etapa: ordem.get(etapa, len(ordem)))
+
+
+def tabela_perfil(registros):
+    df = pd.DataFrame(registros, columns=_COLUNAS)
+    return df.astype({"linhas": "Int64"})
+
+
+def resumo_por_etapa(registros):
+    df = pd.DataFrame(registros, columns=_COLUNAS)
+    resumo = df.groupby("etapa", sort=False).agg(
+        arquivos=("arquivo", "nunique"), chamadas=("chamadas", "sum"), segundos=("segundos", "sum"),
+        linhas=("linhas", lambda linhas: linhas.sum(min_count=1)),
+        memoria_mb=("memoria_mb", lambda memoria: memoria.sum(min_count=1)),
+    ).reset_index()
+    resumo["linhas"] = resumo["linhas"].astype("Int64")
+    total = resumo["segundos"].sum()
+    resumo["percentual"] = resumo["segundos"] / total * 100 if total else 0.0
+    resumo["linhas_por_s"] = resumo["linhas"] / resumo["segundos"].where(resumo["segundos"] > 0)
+    return resumo.sort_values("etapa", key=_ordem_etapa, kind="stable", ignore_index=True)
+
+
+# Nomes legíveis das etapas, para exibir as tabelas
+def rotular_etapas(df):
+    return df.assign(etapa=df["etapa"].map(lambda etapa: ETAPAS.get(etapa, etapa)))
+
+
+def perfil_json(registros):
+    resumo = resumo_por_etapa(registros).astype(object)
+    resumo = resumo.where(resumo.notna(), None)
+    return json.dumps({"registros": list(registros), "por_etapa": resumo.to_dict(orient="records")},
+                      indent=2, ensure_ascii=False)
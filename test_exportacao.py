@@ -0,0 +1,37 @@
+import io
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from exportacao import TAMANHO_BLOCO_EXPORTACAO, exportar_parquet
+from tipagem_xte import tipar_df
+
+
+# Consolidado de um lote com idades e outro sem: 'Idade_na_Realização' fica object com
+# números e vazios, e o lote sem idades pode ocupar o primeiro bloco inteiro
+def _consolidado(sem_idade_primeiro):
+    com_idade = pd.DataFrame({'Nome da Origem': 'com_idade.xte', 'numeroGuia_prestador': '1',
+                              'Idade_na_Realização': [40, 7]})
+    sem_idade = pd.DataFrame({'Nome da Origem': 'sem_idade.xte', 'numeroGuia_prestador': '2',
+                              'Idade_na_Realização': [None] * (TAMANHO_BLOCO_EXPORTACAO + 1)})
+    lotes = [sem_idade, com_idade] if sem_idade_primeiro else [com_idade, sem_idade]
+    return pd.concat(lotes, ignore_index=True)
+
+
+def _idades(df):
+    destino = io.BytesIO()
+    exportar_parquet(df, destino)
+    destino.seek(0)
+    return pq.read_table(destino).column('Idade_na_Realização').to_pylist()
+
+
+def test_parquet_com_lote_sem_idade():
+    for sem_idade_primeiro in (False, True):
+        df = _consolidado(sem_idade_primeiro)
+        esperado = [None if pd.isna(idade) else int(idade) for idade in df['Idade_na_Realização']]
+        assert _idades(df) == esperado
+
+
+def test_parquet_com_lote_sem_idade_modo_compacto():
+    df = _consolidado(sem_idade_primeiro=True)
+    assert len(_idades(tipar_df(df))) == len(df)
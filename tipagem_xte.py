@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+from leitura_xte import colunas_finais
+
+
+# --- DataFrame tipado (modo compacto) ---
+# Valores monetários viram float, quantidades viram inteiro e colunas de código com poucos
+# valores distintos viram category. Uma coluna só é convertida quando todos os textos dela
+# voltam exatamente iguais na exportação ('%.2f' para valores, str(int) para quantidades);
+# do contrário ela fica como texto. Vazios ('' ou None) voltam como vazio.
+COLUNAS_MONETARIAS = [col for col in colunas_finais if col.startswith('valor')]
+COLUNAS_QUANTIDADE = [col for col in colunas_finais if col.startswith(('quantidade', 'diarias'))]
+FORMATO_MONETARIO = '%.2f'
+
+# Limite de valores distintos (em relação ao total de linhas) para virar category
+PROPORCAO_MAXIMA_CATEGORIA = 0.5
+
+_REGEX_INTEIRO = r'0|-?[1-9]\d{0,17}'
+_REGEX_MONETARIO = r'-?(0|[1-9]\d{0,12})\.\d{2}'
+
+
+def _converter_numerico(serie, regex, tipo):
+    # Confere e converte só os valores distintos; as linhas recebem o resultado pelos códigos
+    codigos, distintos = pd.factorize(serie.mask(serie == ''))
+    distintos = pd.Series(distintos, dtype=object)
+    if not (distintos.str.fullmatch(regex) == True).all():
+        return None
+    numeros = pd.to_numeric(distintos).to_numpy(dtype=np.float64 if tipo == 'float64' else np.int64)
+    if tipo == 'float64':
+        return pd.Series(np.append(numeros, np.nan).take(codigos), index=serie.index)
+    valores = pd.array(np.append(numeros, 0).take(codigos), dtype='Int64')
+    valores[codigos == -1] = pd.NA
+    return pd.Series(valores, index=serie.index)
+
+
+def tipar_df(df):
+    tipado = {}
+    for col in df.columns:
+        serie = df[col]
+        if serie.dtype != object:
+            tipado[col] = serie
+            continue
+
+        convertido = None
+        if col in COLUNAS_QUANTIDADE:
+            convertido = _converter_numerico(serie, _REGEX_INTEIRO, 'Int64')
+        if convertido is None and col in COLUNAS_MONETARIAS + COLUNAS_QUANTIDADE:
+            convertido = _converter_numerico(serie, _REGEX_MONETARIO, 'float64')
+        if convertido is None and len(serie) and serie.nunique(dropna=True) <= PROPORCAO_MAXIMA_CATEGORIA * len(serie):
+            convertido = serie.astype('category')
+        tipado[col] = serie if convertido is None else convertido
+    return pd.DataFrame(tipado, index=df.index)
+
+
+def _textos_por_distintos(serie, formatar):
+    codigos, distintos = pd.factorize(serie)
+    textos = np.array([formatar(valor) for valor in distintos] + [None], dtype=object)
+    return pd.Series(textos.take(codigos), index=serie.index, dtype=object)
+
+
+# Volta para o DataFrame de textos que a leitura produz, para exportar exatamente os mesmos
+# valores. Funciona em qualquer fatia do DataFrame tipado (útil para exportar em blocos).
+def restaurar_texto(df):
+    restaurado = {}
+    for col in df.columns:
+        serie = df[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            serie = serie.astype(object).where(serie.notna(), None)
+        elif isinstance(serie.dtype, pd.Int64Dtype):
+            serie = _textos_por_distintos(serie, lambda valor: str(int(valor)))
+        elif serie.dtype == np.float64 and col in COLUNAS_MONETARIAS + COLUNAS_QUANTIDADE:
+            serie = _textos_por_distintos(serie, lambda valor: FORMATO_MONETARIO % valor)
+        restaurado[col] = serie
+    return pd.DataFrame(restaurado, index=df.index)
@@ -0,0 +1,92 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+# --- Trabalhos em segundo plano ---
+# Cada trabalho roda numa thread, fora do script do Streamlit: um rerun (clique, download,
+# outra opção) não interrompe nem repete o trabalho, só volta a consultar o andamento ou o
+# resultado. `funcao(trabalho, *args)` informa o progresso em `trabalho.andamento` e guarda
+# em `trabalho.artefatos` os arquivos que os downloads vão ler.
+class Trabalho:
+    def __init__(self, chave, funcao, *args):
+        self.chave = chave
+        self.andamento = {}
+        self.artefatos = {}
+        self.resultado = None
+        self.erro = None
+        self.inicio = time.time()
+        self.fim = None
+        self._trava = threading.Lock()
+        self._thread = threading.Thread(target=self._executar, args=(funcao, args), daemon=True)
+        self._thread.start()
+
+    def _executar(self, funcao, args):
+        try:
+            self.resultado = funcao(self, *args)
+        except Exception as erro:
+            self.erro = erro
+        finally:
+            self.fim = time.time()
+
+    @property
+    def concluido(self):
+        return self.fim is not None
+
+    @property
+    def segundos(self):
+        return (self.fim or time.time()) - self.inicio
+
+    def aguardar(self, timeout=None):
+        self._thread.join(timeout)
+        return self.concluido
+
+    # Resultado da função, ou o erro dela levantado de novo aqui
+    def obter_resultado(self):
+        self.aguardar()
+        if self.erro is not None:
+            raise self.erro
+        return self.resultado
+
+    # Conteúdo de um artefato (arquivo com seek). `montar()` cria o arquivo na primeira vez;
+    # a trava garante uma montagem só mesmo com downloads simultâneos.
+    def ler_artefato(self, nome, montar=None):
+        with self._trava:
+            if nome not in self.artefatos:
+                self.artefatos[nome] = montar()
+            arquivo = self.artefatos[nome]
+            arquivo.seek(0)
+            return arquivo.read()
+
+    def descartar(self):
+        # Trabalho ainda em andamento termina sozinho; os arquivos dele vão com o coletor de lixo
+        if not self.concluido:
+            return
+        with self._trava:
+            for arquivo in self.artefatos.values():
+                arquivo.close()
+            self.artefatos.clear()
+
+
+# Chave do trabalho: hash do arquivo enviado mais as opções que mudam o resultado
+def chave_trabalho(dados, *opcoes):
+    return hashlib.sha256(dados).hexdigest(), repr(opcoes)
+
+
+# Trabalhos de uma sessão, do mais antigo para o mais recente. Guarda só os últimos
+# `maximo`, para ir e voltar entre duas opções sem refazer nada.
+class ArmazemTrabalhos:
+    def __init__(self, maximo=2):
+        self.maximo = maximo
+        self.trabalhos = OrderedDict()
+
+    def obter(self, chave, funcao, *args):
+        trabalho = self.trabalhos.get(chave)
+        if trabalho is None:
+            trabalho = self.trabalhos[chave] = Trabalho(chave, funcao, *args)
+        self.trabalhos.move_to_end(chave)
+        while len(self.trabalhos) > self.maximo:
+            _, antigo = self.trabalhos.popitem(last=False)
+            antigo.descartar()
+        return trabalho
@@ -0,0 +1,246 @@
+import numpy as np
+import pandas as pd
+
+from esquema_tiss import CABECALHO, GUIA, PROCEDIMENTOS, campos
+from geracao_xte import ler_planilha_em_blocos, origens_em_sequencia
+from perfil import medir
+
+
+# --- Validação da planilha antes da geração ---
+# Confere a planilha inteira coluna a coluna, sem laço por linha: cada regra olha só os
+# valores distintos da coluna (factorize) e o resultado volta para as linhas pelos códigos.
+# Os campos da guia são conferidos na linha que a geração usa para a guia (a primeira linha
+# dela); os do procedimento, em cada linha com procedimento. Devolve um relatório com uma
+# linha por problema, vazio quando a planilha está em ordem.
+COLUNAS_RELATORIO = ['Linha', 'Nome da Origem', 'numeroGuia_prestador', 'Coluna', 'Valor', 'Regra', 'Mensagem']
+
+# A guia é identificada do mesmo jeito que na geração, dentro de cada arquivo de origem
+CHAVE_GUIA = ['Nome da Origem', 'numeroGuia_prestador', 'numeroGuia_operadora', 'identificacaoReembolso']
+
+CAMPOS_OBRIGATORIOS_GUIA = [
+    'competenciaLote', 'registroANS_cabecalho', 'tipoRegistro', 'versaoTISSPrestador', 'formaEnvio',
+    'CNES', 'identificadorExecutante', 'codigoCNPJ_CPF', 'municipioExecutante', 'sexo', 'dataNascimento',
+    'municipioResidencia', 'tipoEventoAtencao', 'origemEventoAtencao', 'numeroGuia_prestador',
+    'numeroGuia_operadora', 'identificacaoReembolso', 'dataProcessamentoGuia', 'valorTotalInformado',
+    'valorProcessado', 'valorTotalPagoProcedimentos', 'valorPagoGuia',
+]
+CAMPOS_OBRIGATORIOS_PROCEDIMENTO = ['codigoTabela', 'quantidadeInformada', 'valorInformado', 'quantidadePaga', 'valorPagoProc']
+
+_CAMPOS_PROCEDIMENTO = {campo['coluna'] for campo in campos(PROCEDIMENTOS)}
+_CAMPOS_ESCRITOS = [campo['coluna'] for campo in campos(CABECALHO) + campos(GUIA)]
+
+# Campos que a geração ajusta antes de escrever (o identificacaoReembolso vazio vira zeros
+# nas guias de origem 1 a 3): o obrigatório é conferido no valor já ajustado
+_AJUSTES = {campo['coluna']: campo['ajuste'] for campo in campos(GUIA) + campos(PROCEDIMENTOS) if campo['ajuste']}
+
+COLUNAS_DATA = [campo['coluna'] for campo in campos(GUIA) if campo['data']]
+COLUNAS_MONETARIAS = [coluna for coluna in _CAMPOS_ESCRITOS if coluna.startswith('valor')]
+
+# Decimal do padrão TISS: até 8 dígitos inteiros e 2 decimais, com ponto
+_REGEX_MONETARIO = r'[0-9]{1,8}(\.[0-9]{1,2})?'
+_REGEX_COMPETENCIA = r'[0-9]{4}(0[1-9]|1[0-2])'
+
+PESOS_CPF = (np.arange(10, 1, -1), np.arange(11, 1, -1))
+PESOS_CNPJ = (np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]), np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]))
+
+
+# --- Dígitos verificadores (uma matriz de dígitos por vez) ---
+def dv_modulo_11(digitos, pesos):
+    resto = (digitos * pesos).sum(axis=1) % 11
+    return np.where(resto < 2, 0, 11 - resto)
+
+
+def _matriz_digitos(textos, tamanho):
+    return np.frombuffer(''.join(textos.to_numpy(dtype=object)).encode('ascii'), dtype=np.uint8).reshape(-1, tamanho).astype(np.int64) - 48
+
+
+def _com_dv_modulo_11(textos, tamanho, pesos):
+    validos = textos.str.fullmatch(f'[0-9]{{{tamanho}}}').to_numpy(dtype=bool)
+    digitos = _matriz_digitos(textos[validos], tamanho)
+    confere = ~(digitos == digitos[:, :1]).all(axis=1)
+    for posicao, peso in zip((tamanho - 2, tamanho - 1), pesos):
+        confere &= digitos[:, posicao] == dv_modulo_11(digitos[:, :posicao], peso)
+    validos[validos] = confere
+    return validos
+
+
+def cpf_valido(textos):
+    return _com_dv_modulo_11(textos, 11, PESOS_CPF)
+
+
+def cnpj_valido(textos):
+    return _com_dv_modulo_11(textos, 14, PESOS_CNPJ)
+
+
+# CNS definitivo (1 ou 2) ou provisório (7, 8 ou 9): soma ponderada (pesos 15..1) múltipla de 11
+def cns_valido(textos):
+    validos = textos.str.fullmatch(r'[12789][0-9]{14}').to_numpy(dtype=bool)
+    digitos = _matriz_digitos(textos[validos], 15)
+    validos[validos] = (digitos * np.arange(15, 0, -1)).sum(axis=1) % 11 == 0
+    return validos
+
+
+def cpf_ou_cnpj_valido(textos):
+    return cpf_valido(textos) | cnpj_valido(textos)
+
+
+# Os mesmos formatos que a geração converte para AAAA-MM-DD
+def data_valida(textos):
+    return (pd.to_datetime(textos, format='%d/%m/%Y', errors='coerce').notna()
+            | pd.to_datetime(textos, format='%Y-%m-%d', errors='coerce').notna()).to_numpy()
+
+
+def _formato(regex):
+    return lambda textos: textos.str.fullmatch(regex).to_numpy(dtype=bool)
+
+
+# (coluna, regra, validação dos textos distintos, mensagem)
+REGRAS_FORMATO = (
+    [(coluna, 'data', data_valida, 'Data inválida (use DD/MM/AAAA)') for coluna in COLUNAS_DATA]
+    + [(coluna, 'monetario', _formato(_REGEX_MONETARIO), 'Valor monetário inválido (use 1234.56)')
+       for coluna in COLUNAS_MONETARIAS]
+    + [
+        ('competenciaLote', 'competencia', _formato(_REGEX_COMPETENCIA), 'Competência inválida (use AAAAMM)'),
+        ('cpfBeneficiario', 'cpf', cpf_valido, 'CPF inválido (dígito verificador)'),
+        ('numeroCartaoNacionalSaude', 'cns', cns_valido, 'CNS inválido (dígito verificador)'),
+        ('codigoCNPJ_CPF', 'cnpj_cpf', cpf_ou_cnpj_valido, 'CNPJ/CPF do executante inválido (dígito verificador)'),
+    ]
+)
+
+
+# --- Validação ---
+# Valores distintos (sem espaços nas pontas, como a geração lê a célula) da coluna nas
+# linhas indicadas e o código de cada linha neles; -1 é célula vazia. Os distintos viram
+# texto do pyarrow, bem mais rápido nas expressões regulares em colunas com muitos valores.
+def _distintos(df, coluna, linhas):
+    codigos, distintos = pd.factorize(df[coluna].to_numpy(dtype=object)[linhas])
+    distintos = pd.Series(distintos, dtype=object).astype(str).astype('string[pyarrow]').str.strip()
+    vazios = np.append((distintos == '').to_numpy(dtype=bool), True)
+    return np.where(vazios[codigos], -1, codigos), distintos
+
+
+def _centavos(distintos, validos):
+    valores = pd.to_numeric(distintos.astype(object).where(validos[:-1]), errors='coerce')
+    return np.append(np.rint(valores.to_numpy(dtype=np.float64) * 100), np.nan)
+
+
+def validar_planilha(df):
+    with medir('validacao', len(df)):
+        return _validar(df)
+
+
+def _validar(df):
+    problemas = []
+    colunas = set(df.columns)
+    todas = np.arange(len(df))
+
+    def problema(linhas, coluna, regra, mensagem):
+        if len(linhas):
+            problemas.append((linhas, coluna, regra, mensagem))
+
+    for coluna in ['Nome da Origem'] + CAMPOS_OBRIGATORIOS_GUIA + CAMPOS_OBRIGATORIOS_PROCEDIMENTO:
+        if coluna not in colunas:
+            problemas.append((None, coluna, 'coluna_ausente', 'Coluna obrigatória ausente na planilha'))
+
+    # Linha que representa a guia (a primeira, como na geração) e linhas com procedimento
+    chave = df.reindex(columns=CHAVE_GUIA).astype(object)
+    guia = chave.groupby(CHAVE_GUIA, dropna=False, sort=False).ngroup().to_numpy()
+    linhas_guia = np.flatnonzero(~pd.Series(guia).duplicated().to_numpy())
+    com_procedimento = np.zeros(len(df), dtype=bool)
+    for coluna in ('codigoProcedimento', 'grupoProcedimento'):
+        if coluna in colunas:
+            com_procedimento |= _distintos(df, coluna, todas)[0] != -1
+    linhas_procedimento = np.flatnonzero(com_procedimento)
+
+    # Cada coluna é conferida só nas linhas que a geração escreve
+    distintos = {}
+
+    def coluna_nas_linhas(coluna):
+        if coluna not in distintos:
+            if coluna == 'Nome da Origem':
+                linhas = todas
+            else:
+                linhas = linhas_procedimento if coluna in _CAMPOS_PROCEDIMENTO else linhas_guia
+            distintos[coluna] = (linhas,) + _distintos(df, coluna, linhas)
+        return distintos[coluna]
+
+    for coluna in ['Nome da Origem'] + CAMPOS_OBRIGATORIOS_GUIA + CAMPOS_OBRIGATORIOS_PROCEDIMENTO:
+        if coluna in colunas:
+            linhas, codigos, _ = coluna_nas_linhas(coluna)
+            vazias = linhas[codigos == -1]
+            if coluna in _AJUSTES and len(vazias):
+                ajustadas = pd.DataFrame({coluna: _AJUSTES[coluna](df.iloc[vazias])})
+                vazias = vazias[_distintos(ajustadas, coluna, np.arange(len(vazias)))[0] == -1]
+            problema(vazias, coluna, 'obrigatorio', 'Campo obrigatório vazio')
+
+    validos = {}
+    for coluna, regra, validar, mensagem in REGRAS_FORMATO:
+        if coluna in colunas:
+            linhas, codigos, textos = coluna_nas_linhas(coluna)
+            # A última posição (código -1, vazio) é sempre válida
+            validos[coluna] = np.append(np.asarray(validar(textos), dtype=bool), True)
+            problema(linhas[~validos[coluna][codigos]], coluna, regra, mensagem)
+
+    # Total informado da guia contra a soma do valorInformado dos procedimentos escritos
+    if {'valorTotalInformado', 'valorInformado'} <= colunas:
+        linhas, codigos, textos = coluna_nas_linhas('valorInformado')
+        informado = _centavos(textos, validos['valorInformado'])[codigos]
+        preenchido = ~np.isnan(informado)
+        soma = np.bincount(guia[linhas[preenchido]], weights=informado[preenchido], minlength=len(df))
+
+        linhas, codigos, textos = coluna_nas_linhas('valorTotalInformado')
+        total = _centavos(textos, validos['valorTotalInformado'])[codigos]
+        soma = soma[guia[linhas]]
+        diverge = ~np.isnan(total) & (np.abs(total - soma) >= 1)
+        somas = pd.Series(soma[diverge] / 100).map('{:.2f}'.format).to_numpy(dtype=object)
+        problema(linhas[diverge], 'valorTotalInformado', 'total_guia',
+                 'valorTotalInformado diferente da soma do valorInformado dos procedimentos (' + somas + ')')
+
+    return _relatorio(df, problemas)
+
+
+def _relatorio(df, problemas):
+    partes = []
+    for linhas, coluna, regra, mensagem in problemas:
+        if linhas is None:
+            partes.append(pd.DataFrame({'Coluna': [coluna], 'Regra': [regra], 'Mensagem': [mensagem]}))
+            continue
+
+        def valores(nome):
+            if nome not in df.columns:
+                return None
+            return df[nome].to_numpy(dtype=object)[linhas]
+
+        partes.append(pd.DataFrame({
+            # Linha como aparece na planilha: o cabeçalho é a linha 1
+            'Linha': df.index.to_numpy()[linhas] + 2,
+            'Nome da Origem': valores('Nome da Origem'),
+            'numeroGuia_prestador': valores('numeroGuia_prestador'),
+            'Coluna': coluna,
+            'Valor': valores(coluna),
+            'Regra': regra,
+            'Mensagem': mensagem,
+        }))
+    if not partes:
+        return pd.DataFrame(columns=COLUNAS_RELATORIO)
+    relatorio = pd.concat(partes, ignore_index=True).reindex(columns=COLUNAS_RELATORIO)
+    relatorio['Linha'] = relatorio['Linha'].astype('Int64')
+    return relatorio.sort_values('Linha', kind='stable', na_position='first', ignore_index=True)
+
+
+# Leitura em blocos: cada origem é validada assim que suas linhas terminam (as guias não
+# atravessam origens), sem carregar a planilha inteira
+def validar_em_blocos(excel_file):
+    relatorios = [validar_planilha(df_origem) for _, df_origem in origens_em_sequencia(ler_planilha_em_blocos(excel_file))]
+    relatorios = [relatorio for relatorio in relatorios if not relatorio.empty]
+    if not relatorios:
+        return pd.DataFrame(columns=COLUNAS_RELATORIO)
+    relatorio = pd.concat(relatorios, ignore_index=True)
+    # Colunas ausentes aparecem uma vez só, e não uma por origem
+    ausentes = relatorio['Regra'] == 'coluna_ausente'
+    return pd.concat([relatorio[ausentes].drop_duplicates('Coluna'), relatorio[~ausentes]], ignore_index=True)
+
+
+def resumo_validacao(relatorio):
+    return (relatorio.groupby(['Regra', 'Coluna'], sort=False).size().rename('Ocorrências').reset_index()
+            .sort_values('Ocorrências', ascending=False, kind='stable', ignore_index=True))